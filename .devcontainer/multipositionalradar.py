@@ -12,18 +12,19 @@ import requests
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 import os
 import warnings
 import traceback
-import matplotlib.pyplot as plt
 from rich.console import Console
 from rich.progress import Progress
 from rich.panel import Panel
 from rich.table import Table
-from datetime import date
+import sys
+
+# Shared, Streamlit-free helpers from the app's core module (repository root)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scouting_core import calculate_ages, build_name_index, find_player_by_name as lookup_player_name
+from scouting_report import create_report_document
 
 warnings.filterwarnings('ignore')
 console = Console()
@@ -266,21 +267,12 @@ def get_all_leagues_data(auth_credentials):
     if not all_dfs: raise Exception("No league data could be loaded.")
     return pd.concat(all_dfs, ignore_index=True)
 
-def calculate_age_from_birth_date(birth_date_str):
-    """Calculates player age from a birth date string."""
-    if pd.isna(birth_date_str): return None
-    try:
-        birth_date = pd.to_datetime(birth_date_str).date()
-        today = date.today()
-        return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-    except (ValueError, TypeError): return None
-
 def process_and_percentile_data(df):
     """Processes raw data, calculates ages, and computes position-specific percentiles."""
     console.rule("[bold blue]Processing Player Data[/bold blue]")
     df_processed = df.copy()
     df_processed.columns = [c.replace('player_season_', '') for c in df_processed.columns]
-    df_processed['age'] = df_processed['birth_date'].apply(calculate_age_from_birth_date)
+    df_processed['age'] = calculate_ages(df_processed['birth_date'])
     
     # Calculate a combined tackles and interceptions metric if not present
     if 'padj_tackles_90' in df_processed.columns and 'padj_interceptions_90' in df_processed.columns:
@@ -303,15 +295,14 @@ def process_and_percentile_data(df):
     console.log("✅ Data processing and percentiling complete.")
     return df_processed
 
-def find_player_by_name(df, player_name):
-    """Finds a player by exact or partial name match."""
-    exact_matches = df[df['player_name'].str.lower() == player_name.lower()]
-    if not exact_matches.empty: return exact_matches.iloc[0].copy()
-    
-    partial_matches = df[df['player_name'].str.lower().str.contains(player_name.lower(), na=False)]
-    if not partial_matches.empty:
+def find_player_by_name(df, player_name, name_index=None):
+    """Finds a player by exact (case- and accent-insensitive) name, suggesting close names otherwise."""
+    player, suggestions = lookup_player_name(df, player_name, name_index)
+    if player is not None: return player
+
+    if suggestions:
         console.print(f"\n[yellow]Player '{player_name}' not found. Did you mean one of these?[/yellow]")
-        for _, row in partial_matches[['player_name', 'team_name']].head(5).iterrows():
+        for row in suggestions:
             console.print(f"  - {row['player_name']} ({row['team_name']})")
     else:
         console.print(f"\n[red]Player '{player_name}' not found.[/red]")
@@ -373,131 +364,7 @@ def find_matches(target_player, pool_df, archetype_config, search_mode='similar'
 
 
 # --- 5. REPORTING & VISUALIZATION FUNCTIONS ---
-
-def set_cell_style(cell, text, bold=False, font_size=10, align='CENTER'):
-    """Helper function to style cells in a .docx table."""
-    p = cell.paragraphs[0]
-    p.text = str(text)
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER if align == 'CENTER' else WD_ALIGN_PARAGRAPH.LEFT
-    run = p.runs[0]
-    run.font.name = 'Calibri'
-    run.font.size = Pt(font_size)
-    run.font.bold = bold
-
-def create_enhanced_radar_chart(player_data, reference_player, radar_config, filepath):
-    """Creates an improved radar chart and saves it to a file."""
-    plt.style.use('seaborn-v0_8-notebook')
-    metrics_dict = radar_config['metrics']
-    labels = ['\n'.join(l.split()) for l in metrics_dict.values()]
-    num_vars = len(labels)
-    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist() + [0]
-    
-    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-    fig.patch.set_facecolor('#F5F5F5')
-    
-    def get_percentiles(player, metrics):
-        values = [max(0, min(100, player.get(f'{m}_pct', 50))) for m in metrics.keys()]
-        return values + [values[0]]
-        
-    player_values = get_percentiles(player_data, metrics_dict)
-    player_avg = np.mean(player_values[:-1])
-    player_legend = f"{player_data['player_name']} (Avg: {player_avg:.0f}th %ile)"
-    
-    ax.set_rgrids([20, 40, 60, 80], angle=180)
-    ax.set_ylim(0, 105)
-    ax.grid(True, color='grey', linestyle='--', linewidth=0.5, alpha=0.5)
-    
-    ax.fill(angles, player_values, color=radar_config['color'], alpha=0.3, zorder=5)
-    ax.plot(angles, player_values, color=radar_config['color'], linewidth=2.5, zorder=6, label=player_legend)
-    
-    for i, value in enumerate(player_values[:-1]):
-        angle = angles[i]
-        ax.text(angle, value + 7, f"{value:.0f}", ha='center', va='center', fontweight='bold', size=9,
-                color='black', bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', boxstyle='round,pad=0.2'))
-    
-    if reference_player is not None:
-        ref_values = get_percentiles(reference_player, metrics_dict)
-        ref_avg = np.mean(ref_values[:-1])
-        ref_legend = f"Target: {reference_player['player_name']} (Avg: {ref_avg:.0f}th %ile)"
-        ax.plot(angles, ref_values, color='#4A90E2', linewidth=2, zorder=4, linestyle='--', label=ref_legend)
-    
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(labels, size=10, fontweight='bold')
-    
-    ax.set_title(f"{radar_config['name']} | {player_data['player_name']}", size=16, fontweight='bold', y=1.12)
-    ax.legend(loc='upper right', bbox_to_anchor=(1.5, 1.15))
-    
-    plt.savefig(filepath, bbox_inches='tight', dpi=300)
-    plt.close()
-
-def create_report_document(target_player, top_matches, other_matches, archetype_dna, search_config, target_radars, comp_radars):
-    """Assembles the final .docx report."""
-    doc = Document()
-    doc.styles['Normal'].font.name = 'Calibri'
-    doc.add_heading(f'{search_config["position"]} {search_config["mode"].title()} Report', 0).alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_heading(f'Target Player: {target_player["player_name"]}', level=1)
-
-    age = target_player.get('age')
-    age_str = f"{int(age)}" if pd.notna(age) else "N/A"
-    doc.add_paragraph(f"**Age:** {age_str} | **Team:** {target_player['team_name']} | **League:** {target_player['league_name']}")
-
-    doc.add_heading('Archetype DNA & Search Filters', level=2)
-    dna_table = doc.add_table(rows=1, cols=2)
-    dna_table.style = 'Table Grid'
-    set_cell_style(dna_table.cell(0, 0), "Archetype", bold=True)
-    set_cell_style(dna_table.cell(0, 1), "Affinity Score", bold=True)
-    for name, score in sorted(archetype_dna.items(), key=lambda item: item[1], reverse=True):
-        cells = dna_table.add_row().cells
-        set_cell_style(cells[0], name)
-        set_cell_style(cells[1], f"{score:.1f}")
-
-    doc.add_paragraph(f"\n**Detected Archetype:** {search_config['archetype']}\n**Search Mode:** {search_config['mode'].title()}")
-
-    doc.add_heading('Target Player Performance Radars', level=2)
-    num_radars = len(target_radars)
-    rows = (num_radars + 2) // 3
-    radar_table = doc.add_table(rows=rows, cols=3)
-    for i, path in enumerate(target_radars):
-        p = radar_table.cell(i // 3, i % 3).paragraphs[0]
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        p.add_run().add_picture(path, width=Inches(2.3))
-
-    if not top_matches.empty:
-        doc.add_page_break()
-        doc.add_heading(f"Top {len(top_matches)} Matches", level=1)
-        for i, (_, player) in enumerate(top_matches.iterrows()):
-            age = player.get('age')
-            age_str = f"{int(age)}" if pd.notna(age) else "N/A"
-            score_col = 'upgrade_score' if search_config["mode"] == 'upgrade' else 'similarity_score'
-            score_label = "Upgrade Score" if search_config["mode"] == 'upgrade' else "Similarity"
-            doc.add_heading(f"#{i+1}: {player['player_name']} ({score_label}: {player[score_col]:.1f})", level=2)
-            doc.add_paragraph(f"**Age:** {age_str} | **Team:** {player['team_name']} | **League:** {player['league_name']}")
-            
-            comp_radars_table = doc.add_table(rows=rows, cols=3)
-            player_radar_paths = comp_radars[i]
-            for j, path in enumerate(player_radar_paths):
-                p = comp_radars_table.cell(j // 3, j % 3).paragraphs[0]
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                p.add_run().add_picture(path, width=Inches(2.3))
-            if i < len(top_matches) - 1: doc.add_page_break()
-
-    if not other_matches.empty:
-        doc.add_page_break()
-        doc.add_heading("Other Notable Matches", level=1)
-        table = doc.add_table(rows=1, cols=5)
-        table.style = 'Table Grid'
-        headers = ['Rank', 'Player', 'Age', 'Team', 'League']
-        for i, h in enumerate(headers): set_cell_style(table.cell(0, i), h, bold=True)
-        for i, (_, row) in enumerate(other_matches.iterrows()):
-            cells = table.add_row().cells
-            set_cell_style(cells[0], str(i + len(top_matches) + 1))
-            set_cell_style(cells[1], row['player_name'], align='LEFT')
-            age = row.get('age')
-            set_cell_style(cells[2], f"{int(age)}" if pd.notna(age) else "N/A")
-            set_cell_style(cells[3], row['team_name'], align='LEFT')
-            set_cell_style(cells[4], row['league_name'], align='LEFT')
-    
-    return doc
+# Radar rendering and report assembly live in the shared report engine (scouting_report.py)
 
 
 # --- 6. MAIN EXECUTION SCRIPT ---
@@ -508,6 +375,7 @@ def main():
     try:
         raw_data = get_all_leagues_data((USERNAME, PASSWORD))
         processed_data = process_and_percentile_data(raw_data)
+        name_index = build_name_index(processed_data)
         
         while True:
             console.print("\n" + "="*80)
@@ -532,7 +400,7 @@ def main():
             if player_name.lower() == 'quit': break
             if not player_name: continue
 
-            target_player = find_player_by_name(processed_data, player_name)
+            target_player = find_player_by_name(processed_data, player_name, name_index)
             if target_player is None: continue
             
             if target_player['primary_position'] not in config['positions']:
@@ -579,33 +447,16 @@ def main():
                 export_folder = "player_reports"
                 os.makedirs(export_folder, exist_ok=True)
                 safe_target_name = sanitize_filename(target_player['player_name'])
-                
-                target_radars, comp_radars = [], []
-                with Progress() as progress:
-                    task = progress.add_task("[magenta]Generating radars...", total=num_charts)
-                    
-                    for _, r_config in radar_metrics.items():
-                        path = os.path.join(export_folder, sanitize_filename(f"radar_solo_{safe_target_name}_{r_config['name']}.png"))
-                        create_enhanced_radar_chart(target_player, None, r_config, path)
-                        target_radars.append(path)
-                        progress.update(task, advance=1)
-                    
-                    for _, player_row in top_5_matches.iterrows():
-                        player_radars = []
-                        for _, r_config in radar_metrics.items():
-                            path = os.path.join(export_folder, sanitize_filename(f"radar_comp_{player_row['player_name']}_{r_config['name']}.png"))
-                            create_enhanced_radar_chart(player_row, target_player, r_config, path)
-                            player_radars.append(path)
-                            progress.update(task, advance=1)
-                        comp_radars.append(player_radars)
 
                 search_config = {'mode': search_mode, 'archetype': detected_archetype, 'position': selected_position_name}
-                doc = create_report_document(target_player, top_5_matches, other_matches, archetype_scores, search_config, target_radars, comp_radars)
+                with Progress() as progress:
+                    task = progress.add_task("[magenta]Generating radars...", total=num_charts)
+                    doc = create_report_document(
+                        target_player, top_5_matches, other_matches, archetype_scores, search_config, radar_metrics,
+                        on_progress=lambda done, total: progress.update(task, completed=done),
+                    )
                 doc_path = os.path.join(export_folder, f"{search_config['position']}_{search_mode.title()}_Report_{safe_target_name}.docx")
                 doc.save(doc_path)
-                
-                for path in target_radars + [p for sublist in comp_radars for p in sublist]:
-                    if os.path.exists(path): os.remove(path)
 
                 console.print(Panel(f"✅ Report for [bold]{target_player['player_name']}[/bold] generated!", title="[bold green]Report Complete[/bold green]"))
                 console.print(f"   [link=file://{os.path.abspath(doc_path)}]{os.path.abspath(doc_path)}[/link]")
@@ -0,0 +1,310 @@
+# ----------------------------------------------------------------------
+# ⚽ Headless Batch Scouting ⚽
+#
+# Non-interactive shortlist generation for many targets at once, e.g. a
+# nightly run over a whole league. Targets come from a CSV/JSON file (or
+# every qualified player of one or more leagues), each position group is
+# scouted in its own worker process, and every match is written to a
+# single Parquet/CSV table.
+#
+#   python batch_scout.py targets.csv -o shortlists.parquet
+#   python batch_scout.py --target-league "Premiership" --scope last2 -o nightly.csv
+# ----------------------------------------------------------------------
+
+# --- 1. IMPORTS ---
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+
+from scouting_core import (
+    FEATURE_STORE_DIR, PLAYER_STATS_CACHE_DIR, POSITIONAL_CONFIGS, GROUP_Z_COLS, load_partitions, dataset_version,
+    load_processed_dataset, prepare_partition_frame, feature_store_key, open_feature_store, is_feature_store_frame,
+    group_rows, build_search_pool, build_similarity_index, find_matches, find_matches_batch, detect_player_archetype,
+    build_name_index, normalize_player_name,
+)
+
+# --- 2. CONFIGURATION ---
+SEARCH_SCOPES = {
+    "last": "Last Season Only",
+    "last2": "Last 2 Seasons",
+    "all": "All Historical Data",
+}
+LEAGUE_FILTERS = {
+    "all": "All Leagues",
+    "domestic": "Domestic Leagues",
+    "scottish": "Scottish Leagues",
+}
+
+# Columns written per match unless --all-columns is given (upgrade_score only exists in upgrade mode)
+OUTPUT_COLUMNS = [
+    'target_player_id', 'target_player_name', 'target_team_name', 'target_season_name', 'target_position_group',
+    'target_archetype',
+    'match_rank', 'match_tier', 'similarity_score', 'upgrade_score', 'player_id', 'player_name', 'team_name', 'league_name',
+    'season_name', 'age', 'primary_position', 'position_group', 'minutes', '_coverage', '_defining_match_count',
+    '_mahal_dist',
+]
+
+
+# --- 3. TARGETS ---
+def read_targets(path):
+    """Reads the target list from a CSV or JSON file (a list of objects, or {"targets": [...]}).
+
+    Each target needs a `player_id` or a `player_name`; `season_id`, `competition_id` and `position_group`
+    (scout the player as a different position group) are optional.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if isinstance(payload, dict):
+            payload = payload.get("targets", [])
+        return pd.DataFrame(payload)
+    return pd.read_csv(path)
+
+
+def resolve_targets(data, targets_spec, position_group=None):
+    """Maps each target spec to one dataset row (latest season, then most minutes, when several match).
+
+    Names match case- and accent-insensitively ('Odegaard' finds 'Ødegaard').
+
+    Returns (targets, unresolved): the target rows, with `position_group` replaced by the per-target
+    or global override, and the specs that matched no row.
+    """
+    rows = []
+    unresolved = []
+    name_index = build_name_index(data) if "player_name" in targets_spec.columns else None
+    for spec in targets_spec.to_dict("records"):
+        spec = {k: v for k, v in spec.items() if not (isinstance(v, float) and pd.isna(v))}
+        if "player_id" in spec:
+            candidates = data[data["player_id"] == int(spec["player_id"])]
+        elif "player_name" in spec:
+            entry = name_index["exact"].get(normalize_player_name(spec["player_name"]))
+            candidates = data.loc[name_index["rows"][entry] if entry is not None else []]
+        else:
+            unresolved.append(spec)
+            continue
+        for col in ("season_id", "competition_id"):
+            if col in spec and col in data.columns:
+                candidates = candidates[candidates[col] == int(spec[col])]
+
+        if candidates.empty:
+            unresolved.append(spec)
+            continue
+        best = candidates.sort_values(["canonical_season", "minutes"], ascending=False).index[0]
+        rows.append((best, spec.get("position_group") or position_group))
+
+    if not rows:
+        return data.iloc[0:0].copy(), unresolved
+    targets = data.loc[[label for label, _ in rows]].copy()
+    overrides = [override for _, override in rows]
+    targets["position_group"] = [
+        override if override else group for override, group in zip(overrides, targets["position_group"].astype(object))
+    ]
+    return targets, unresolved
+
+
+def league_targets(data, league_names, min_minutes=600):
+    """Every player of the given leagues in their latest canonical season, with at least `min_minutes`."""
+    rows = data[data["league_name"].isin(league_names)]
+    if "minutes" in rows.columns:
+        rows = rows[rows["minutes"].fillna(0) >= float(min_minutes)]
+    if rows.empty:
+        return rows.copy()
+    latest = rows.groupby("league_name", observed=True)["canonical_season"].transform("max")
+    targets = rows[(rows["canonical_season"] == latest) & rows["position_group"].notna()].copy()
+    targets["position_group"] = targets["position_group"].astype(object)
+    return targets
+
+
+# --- 4. WORKERS ---
+_worker_data = None
+
+
+def _init_worker(store_key, store_dir, data=None):
+    """Opens the dataset once per worker process: memory-mapped from the feature store when possible."""
+    global _worker_data
+    _worker_data = data if data is not None else open_feature_store(store_key, store_dir)
+
+
+def scout_group(data, group, targets, options):
+    """All matches for one position group's targets, as one long table.
+
+    As in the app, the age filter only decides which players can be returned: the covariance is fitted on the
+    whole minutes-qualified pool, so the same target scores the same whatever the age range.
+    """
+    pool = build_search_pool(group_rows(data, group), options["scope"], options["league_filter"])
+    if pool.empty:
+        return pd.DataFrame()
+    age_pool = pool
+    if 'age' in pool.columns:
+        age_pool = pool[pool['age'].between(options["min_age"], options["max_age"]) | pool['age'].isna()]
+
+    archetypes = POSITIONAL_CONFIGS[group]["archetypes"]
+    target_archetypes = {label: detect_player_archetype(target, archetypes, group)[0] for label, target in targets.iterrows()}
+
+    if options["mode"] == "similar":
+        matches = find_matches_batch(targets, pool, min_minutes=options["min_minutes"], top_n=options["top_n"],
+                                     candidate_rows=age_pool.index)
+    else:
+        index_pool = pool[pool['minutes'].fillna(0) >= float(options["min_minutes"])] if 'minutes' in pool.columns else pool
+        z_cols = [c for c in GROUP_Z_COLS.get(group, []) if c in index_pool.columns]
+        similarity_index = build_similarity_index(index_pool, z_cols) if z_cols and not index_pool.empty else None
+        per_target = []
+        for label, target in targets.iterrows():
+            archetype = target_archetypes[label]
+            if not archetype:
+                continue
+            found = find_matches(target, age_pool, archetypes[archetype], search_mode="upgrade",
+                                 min_minutes=options["min_minutes"], top_n=options["top_n"],
+                                 similarity_index=similarity_index)
+            if found.empty:
+                continue
+            found = found.assign(target_index=label, target_player_id=target.get("player_id"),
+                                 target_player_name=target.get("player_name"), match_rank=range(1, len(found) + 1))
+            per_target.append(found)
+        matches = pd.concat(per_target) if per_target else pd.DataFrame()
+
+    if matches.empty:
+        return matches
+    for col in ("team_name", "season_name"):
+        if col in targets.columns:
+            matches[f"target_{col}"] = matches["target_index"].map(targets[col].astype(object))
+    matches["target_position_group"] = group
+    matches["target_archetype"] = matches["target_index"].map(target_archetypes)
+    return matches.reset_index(drop=True)
+
+
+def _scout_group_task(group, targets, options):
+    return scout_group(_worker_data, group, targets, options)
+
+
+def run_batch(data, targets, options, store_key=None, store_dir=FEATURE_STORE_DIR, workers=None):
+    """Scouts every target, one task per position group, in a process pool when `workers` > 1.
+
+    Workers reopen the memory-mapped feature store by key, so the dataset is never pickled to them; without
+    a store it is sent once per worker. Configurations stay in the workers' own module (only group names and
+    target rows cross the process boundary).
+    """
+    groups = [g for g in targets["position_group"].dropna().unique() if g in POSITIONAL_CONFIGS]
+    tasks = {g: targets[targets["position_group"] == g] for g in groups}
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    results = []
+    if workers <= 1:
+        for group, targets_g in tasks.items():
+            results.append(scout_group(data, group, targets_g, options))
+    else:
+        store_backed = store_key is not None and is_feature_store_frame(data)
+        initargs = (store_key, store_dir) if store_backed else (None, None, data)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            futures = {executor.submit(_scout_group_task, group, targets_g, options): group
+                       for group, targets_g in tasks.items()}
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    results = [r for r in results if not r.empty]
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+
+def write_matches(matches, path, all_columns=False):
+    """Writes the match table as Parquet (.parquet/.pq) or CSV (anything else)."""
+    if "target_index" in matches.columns:
+        matches = matches.sort_values(["target_index", "match_rank"], kind="stable")
+    if not all_columns:
+        matches = matches[[c for c in OUTPUT_COLUMNS if c in matches.columns]]
+    if path.lower().endswith((".parquet", ".pq")):
+        # Object columns holding mixed types are not Parquet-safe
+        for col in matches.columns[matches.dtypes == object]:
+            matches[col] = matches[col].astype(str).where(matches[col].notna())
+        matches.to_parquet(path, index=False)
+    else:
+        matches.to_csv(path, index=False)
+
+
+# --- 5. COMMAND LINE ---
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate similarity shortlists for many players without the UI.")
+    parser.add_argument("targets", nargs="?", help="CSV or JSON file of targets (player_id or player_name, "
+                                                   "optional season_id, competition_id, position_group)")
+    parser.add_argument("--target-league", action="append", default=[], metavar="LEAGUE",
+                        help="Scout every qualified player of this league's latest season (repeatable)")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.parquet or .csv)")
+    parser.add_argument("--position", choices=sorted(POSITIONAL_CONFIGS), help="Scout all targets as this position group")
+    parser.add_argument("--mode", choices=("similar", "upgrade"), default="similar")
+    parser.add_argument("--scope", choices=sorted(SEARCH_SCOPES), default="last", help="Seasons to search")
+    parser.add_argument("--league-filter", choices=sorted(LEAGUE_FILTERS), default="all")
+    parser.add_argument("--min-minutes", type=int, default=600)
+    parser.add_argument("--min-age", type=float, default=16)
+    parser.add_argument("--max-age", type=float, default=40)
+    parser.add_argument("--top-n", type=int, default=100, help="Matches kept per target")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="Date ages are computed on (YYYY-MM-DD)")
+    parser.add_argument("--cache-dir", default=PLAYER_STATS_CACHE_DIR, help="Raw partition store")
+    parser.add_argument("--offline", action="store_true", help="Only use cached partitions, never call the API")
+    parser.add_argument("--all-columns", action="store_true", help="Write every dataset column for each match")
+    args = parser.parse_args(argv)
+    if not args.targets and not args.target_league:
+        parser.error("give a targets file and/or --target-league")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.time()
+
+    username, password = os.getenv("STATSBOMB_USERNAME"), os.getenv("STATSBOMB_PASSWORD")
+    auth = (username, password) if username and password and not args.offline else None
+    partitions, versions, api_error = load_partitions(auth, cache_dir=args.cache_dir)
+    if api_error is not None:
+        print(f"Could not reach the API, using cached data where available. Error: {api_error}", file=sys.stderr)
+    if not partitions:
+        print("No player data available (empty cache and no API access).", file=sys.stderr)
+        return 1
+
+    as_of = args.as_of or date.today()
+    data_version = dataset_version(versions)
+    data = load_processed_dataset(lambda key, version: prepare_partition_frame(partitions[key], as_of),
+                                  data_version, as_of)
+    store_key = feature_store_key((data_version, as_of))
+    print(f"Loaded {len(data)} player-seasons from {len(partitions)} league/seasons.", file=sys.stderr)
+
+    target_frames = []
+    if args.targets:
+        targets, unresolved = resolve_targets(data, read_targets(args.targets), args.position)
+        for spec in unresolved:
+            print(f"Target not found: {spec}", file=sys.stderr)
+        target_frames.append(targets)
+    if args.target_league:
+        targets = league_targets(data, args.target_league, args.min_minutes)
+        if args.position:
+            targets["position_group"] = args.position
+        target_frames.append(targets)
+    targets = pd.concat(target_frames)
+    targets = targets[~targets.index.duplicated()]
+    if targets.empty:
+        print("No targets to scout.", file=sys.stderr)
+        return 1
+
+    options = {
+        "mode": args.mode,
+        "scope": SEARCH_SCOPES[args.scope],
+        "league_filter": LEAGUE_FILTERS[args.league_filter],
+        "min_minutes": args.min_minutes,
+        "min_age": args.min_age,
+        "max_age": args.max_age,
+        "top_n": args.top_n,
+    }
+    matches = run_batch(data, targets, options, store_key=store_key, workers=args.workers)
+    write_matches(matches, args.output, all_columns=args.all_columns)
+    print(f"Wrote {len(matches)} matches for {len(targets)} targets to {args.output} "
+          f"in {time.time() - started:.1f}s.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# ----------------------------------------------------------------------
+# ⚽ Benchmark: per-position percentiles & z-scores ⚽
+#
+# Times the per-metric / per-group loop process_data used to run against
+# the single-pass compute_group_percentiles on a synthetic league frame,
+# and checks that both produce the same <metric>_pct / <metric>_z values.
+#
+#   python benchmarks/bench_processing.py
+#   python benchmarks/bench_processing.py --rows 20000 --repeat 5
+# ----------------------------------------------------------------------
+
+# --- 1. IMPORTS ---
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scouting_core import ALL_METRICS_TO_PERCENTILE, NEGATIVE_STATS, POSITIONAL_CONFIGS, compute_group_percentiles
+
+
+# --- 2. SYNTHETIC DATA ---
+
+def make_frame(n_rows, seed=0, missing_rate=0.05):
+    """League-sized frame: every percentiled metric, realistic group sizes, gaps, ties and edge cases."""
+    rng = np.random.default_rng(seed)
+    groups = list(POSITIONAL_CONFIGS)
+    df = pd.DataFrame({'position_group': rng.choice(groups, size=n_rows)})
+    for metric in ALL_METRICS_TO_PERCENTILE:
+        values = rng.gamma(2.0, 1.5, size=n_rows).round(2)  # rounding gives plenty of ties
+        values[rng.random(n_rows) < missing_rate] = np.nan
+        df[metric] = values
+    df[ALL_METRICS_TO_PERCENTILE[0]] = 1.0  # a constant metric
+    df.loc[df.index[:3], 'position_group'] = 'Tiny Group'  # a group below the minimum size
+    return df
+
+
+# --- 3. IMPLEMENTATIONS ---
+
+def legacy_group_percentiles(df, metrics, negative_stats=()):
+    """The loop process_data ran before compute_group_percentiles: regroup and refit per metric."""
+    df = df.copy()
+    # The old code wrote float ranks into int-initialised columns and grew the frame one column at a time
+    warnings.simplefilter('ignore', FutureWarning)
+    warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+    for metric in metrics:
+        df[f'{metric}_pct'] = 0
+        df[f'{metric}_z'] = 0.0
+
+        for group, group_df in df.groupby('position_group', dropna=False):
+            if group is None or len(group_df) < 5:
+                continue
+
+            metric_series = group_df[metric]
+
+            if metric in negative_stats:
+                ranks = metric_series.rank(pct=True, ascending=True)
+                df.loc[group_df.index, f'{metric}_pct'] = (1 - ranks) * 100
+            else:
+                df.loc[group_df.index, f'{metric}_pct'] = metric_series.rank(pct=True) * 100
+
+            scaler = StandardScaler()
+            z_scores = scaler.fit_transform(metric_series.values.reshape(-1, 1)).flatten()
+            df.loc[group_df.index, f'{metric}_z'] = z_scores
+
+    derived_cols = [f'{m}_{suffix}' for m in metrics for suffix in ('pct', 'z')]
+    return df[derived_cols]
+
+
+def vectorized_group_percentiles(df, metrics, negative_stats=()):
+    return compute_group_percentiles(df, metrics, negative_stats)
+
+
+# --- 4. RUNNER ---
+
+def best_time(fn, repeat):
+    """Best wall time over `repeat` runs, plus the last result."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-position percentile/z-score computation.")
+    parser.add_argument("--rows", type=int, default=50_000, help="rows in the synthetic frame (default: 50000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    metrics = list(ALL_METRICS_TO_PERCENTILE)
+    df = make_frame(args.rows, seed=args.seed)
+    print(f"{len(df):,} rows x {len(metrics)} metrics, {df['position_group'].nunique()} position groups")
+
+    with warnings.catch_warnings():
+        legacy_s, legacy = best_time(lambda: legacy_group_percentiles(df, metrics, NEGATIVE_STATS), args.repeat)
+    new_s, new = best_time(lambda: vectorized_group_percentiles(df, metrics, NEGATIVE_STATS), args.repeat)
+
+    new = new[legacy.columns]
+    old_values, new_values = legacy.to_numpy(dtype=float), new.to_numpy(dtype=float)
+    if not np.array_equal(np.isnan(old_values), np.isnan(new_values)):
+        raise SystemExit("legacy and vectorized results disagree on missing values")
+    max_diff = np.nanmax(np.abs(old_values - new_values))
+    if max_diff > 1e-9:
+        raise SystemExit(f"legacy and vectorized results differ (max abs diff {max_diff:.3g})")
+
+    print(f"legacy loop:               {legacy_s:7.2f}s")
+    print(f"compute_group_percentiles: {new_s:7.2f}s  ({legacy_s / new_s:.1f}x faster, max abs diff {max_diff:.1e})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
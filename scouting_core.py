@@ -0,0 +1,2079 @@
+# ----------------------------------------------------------------------
+# ⚽ Scouting core: configuration, data processing and the similarity engine ⚽
+#
+# Shared by the Streamlit app (app.py) and headless jobs. Imports neither
+# Streamlit nor Plotly; requests, scikit-learn and SciPy are only imported
+# by the functions that need them, so importing this module stays cheap.
+# ----------------------------------------------------------------------
+
+# --- 1. IMPORTS ---
+import os
+import re
+import json
+import shutil
+import hashlib
+import time
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+
+# --- 2. CONFIGURATION ---
+
+STATSBOMB_API_URL = "https://data.statsbombservices.com/api"
+
+# Concurrency / retry settings for the league downloader
+FETCH_MAX_WORKERS = 8
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5
+
+# On-disk store of raw /player-stats partitions (one Parquet file per competition/season)
+PLAYER_STATS_CACHE_DIR = os.getenv(
+    "PLAYER_STATS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "player_stats")
+)
+PLAYER_STATS_MAX_AGE = 3600  # seconds before a cached partition is considered stale
+
+# Memory-mapped store of processed datasets, shared by every app process on the host
+FEATURE_STORE_DIR = os.getenv(
+    "FEATURE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "features")
+)
+FEATURE_STORE_KEEP = 2  # dataset versions kept on disk
+FEATURE_STORE_SCHEMA = 3  # bump when processing adds or changes stored columns, so older stores are rebuilt
+
+# Compact in-memory layout for the processed dataset (categorical strings, float32 `_pct` / `_z` blocks)
+COMPACT_PROCESSED_DATA = os.getenv("COMPACT_PROCESSED_DATA", "1") != "0"
+CATEGORICAL_COLUMNS = ('league_name', 'team_name', 'season_name', 'primary_position', 'position_group', 'archetype',
+                       'runner_up_archetype')
+
+# Approximate clone search kicks in for pools at least this large
+ANN_MIN_POOL_SIZE = 20000
+ANN_CANDIDATES = 2000
+
+# Archetype prefilter (optional): only score candidates whose affinity to the target's archetype is within
+# ARCHETYPE_PREFILTER_MARGIN points of the target's own, plus that archetype's ARCHETYPE_PREFILTER_TOP_K players
+# (recall floor vs the full search, checked by tests/test_archetype_prefilter.py: recall@10 >= 0.6, True Clones >= 0.95)
+ARCHETYPE_PREFILTER_MARGIN = 15.0
+ARCHETYPE_PREFILTER_TOP_K = 500
+
+# Pool covariance estimates (covariance, pseudo-inverse, whitening) kept per process, least recently used first out
+COVARIANCE_CACHE_SIZE = int(os.getenv("COVARIANCE_CACHE_SIZE", "32"))
+
+
+# --- 3. CORE & POSITIONAL CONFIGURATIONS ---
+# Every config below is read-only: dicts are exposed as mappingproxies and lists as tuples.
+
+
+def _freeze(value):
+    """Read-only copy of a nested config (dict -> mappingproxy, list -> tuple, set -> frozenset)."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+LEAGUE_NAMES = _freeze({
+    4: "League One", 5: "League Two", 51: "Premiership", 65: "National League",
+    76: "Liga", 78: "1. HNL", 89: "USL Championship", 106: "Veikkausliiga",
+    107: "Premier Division", 129: "Championnat National", 166: "Premier League 2 Division One",
+    179: "3. Liga", 260: "1st Division", 1035: "First Division B", 1385: "Championship",
+    1442: "1. Division", 1581: "2. Liga", 1607: "Úrvalsdeild", 1778: "First Division",
+    1848: "I Liga", 1865: "First League"
+})
+
+COMPETITION_SEASONS = _freeze({
+    4: [235, 281, 317, 318],
+    5: [235, 281, 317, 318],
+    51: [235, 281, 317, 318],
+    65: [281, 318],
+    76: [317, 318],
+    78: [317, 318],
+    89: [106, 107, 282, 315],
+    106: [315],
+    107: [106, 107, 282, 315],
+    129: [317, 318],
+    166: [318],
+    179: [317, 318],
+    260: [317, 318],
+    1035: [317, 318],
+    1385: [235, 281, 317, 318],
+    1442: [107, 282, 315],
+    1581: [317, 318],
+    1607: [315],
+    1778: [282, 315],
+    1848: [281, 317, 318],
+    1865: [318]
+})
+
+# Seasons still in progress; every other season in COMPETITION_SEASONS is finished and its
+# cached partition is treated as immutable (never refetched once on disk).
+CURRENT_SEASON_IDS = frozenset({315, 317, 318})
+
+DOMESTIC_LEAGUE_IDS = (4, 5, 51, 65, 1385, 166)
+SCOTTISH_LEAGUE_IDS = (51,)
+
+# Archetype definitions
+STRIKER_ARCHETYPES = _freeze({
+    "Poacher (Fox in the Box)": {
+        "description": "A clinical finisher who thrives in the penalty area with instinctive movement and a high shot volume. Minimal involvement in build-up play outside the final third. They prioritize shooting over passing.",
+        "identity_metrics": ['npg_90', 'np_xg_90', 'np_shots_90', 'touches_inside_box_90', 'conversion_ratio', 'np_xg_per_shot', 'shot_touch_ratio', 'op_xgchain_90'],
+        "key_weight": 1.7
+    },
+    "Target Man": {
+        "description": "A physically dominant forward with a strong aerial presence, excels at holding up the ball and bringing teammates into play. They are a focal point for long balls and physical duels.",
+        "identity_metrics": ['aerial_wins_90', 'aerial_ratio', 'fouls_won_90', 'op_xgbuildup_90', 'carries_90', 'touches_inside_box_90', 'long_balls_90', 'passing_ratio'],
+        "key_weight": 1.6
+    },
+    "Complete Forward": {
+        "description": "A well-rounded striker capable of doing everything: finishing, dribbling, linking up play, and making intelligent runs. A central figure in both goal-scoring and chance creation.",
+        "identity_metrics": ['npg_90', 'key_passes_90', 'dribbles_90', 'deep_progressions_90', 'op_xgbuildup_90', 'aerial_wins_90', 'op_xgchain_90', 'npxgxa_90'],
+        "key_weight": 1.6
+    },
+    "False 9": {
+        "description": "A forward who drops deep into midfield to link play, acting more like a playmaker than a traditional striker. They possess excellent technical skills, vision, and a high xG buildup contribution.",
+        "identity_metrics": ['op_xgbuildup_90', 'key_passes_90', 'through_balls_90', 'dribbles_90', 'carries_90', 'xa_90', 'forward_pass_proportion', 'passing_ratio'],
+        "key_weight": 1.5
+    },
+    "Advanced Forward": {
+        "description": "A pacey forward who primarily makes runs in behind the defensive line. They thrive on through balls and quick transitions, focusing on getting into dangerous areas to shoot.",
+        "identity_metrics": ['deep_progressions_90', 'through_balls_90', 'np_shots_90', 'touches_inside_box_90', 'npg_90', 'np_xg_90', 'dribbles_90', 'npxgxa_90'],
+        "key_weight": 1.6
+    },
+    "Pressing Forward": {
+        "description": "A high-energy striker whose main defensive contribution is to harass and pressure opposition defenders. They have a high work rate and actively participate in winning the ball back.",
+        "identity_metrics": ['pressures_90', 'pressure_regains_90', 'counterpressures_90', 'aggressive_actions_90', 'padj_tackles_90', 'fouls_90', 'fhalf_pressures_90', 'fhalf_counterpressures_90'],
+        "key_weight": 1.5
+    },
+})
+
+# Radar metrics
+STRIKER_RADAR_METRICS = _freeze({
+    'finishing': {
+        'name': 'Finishing', 'color': '#D32F2F',
+        'metrics': {
+            'npg_90': 'Non-Penalty Goals', 'np_xg_90': 'Non-Penalty xG',
+            'np_shots_90': 'Shots p90', 'conversion_ratio': 'Shot Conversion %',
+            'np_xg_per_shot': 'Avg. Shot Quality', 'touches_inside_box_90': 'Touches in Box p90'
+        }
+    },
+    'box_presence': {
+        'name': 'Box Presence', 'color': '#AF1D1D',
+        'metrics': {
+            'touches_inside_box_90': 'Touches in Box p90',
+            'passes_inside_box_90': 'Passes in Box p90',
+            'positive_outcome_90': 'Positive Outcomes p90',
+            'shot_touch_ratio': 'Shot/Touch %',
+            'op_passes_into_box_90': 'Passes into Box p90',
+            'np_xg_per_shot': 'Avg. Shot Quality'
+        }
+    },
+    'creation': {
+        'name': 'Creation & Link-Up', 'color': '#FF6B35',
+        'metrics': {
+            'key_passes_90': 'Key Passes p90', 'xa_90': 'xA p90',
+            'op_passes_into_box_90': 'Passes into Box p90', 'through_balls_90': 'Through Balls p90',
+            'op_xgbuildup_90': 'xG Buildup p90', 'passing_ratio': 'Pass Completion %'
+        }
+    },
+    'dribbling': {
+        'name': 'Dribbling & Carrying', 'color': '#9C27B0',
+        'metrics': {
+            'dribbles_90': 'Successful Dribbles p90', 'dribble_ratio': 'Dribble Success %',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'turnovers_90': 'Ball Security (Inv)', 'deep_progressions_90': 'Deep Progressions p90'
+        }
+    },
+    'aerial': {
+        'name': 'Aerial Prowess', 'color': '#607D8B',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won p90', 'aerial_ratio': 'Aerial Win %',
+            'aggressive_actions_90': 'Aggressive Actions p90', 'challenge_ratio': 'Defensive Duel Win %',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'fouls_won_90': 'Fouls Won p90'
+        }
+    },
+    'defensive': {
+        'name': 'Defensive Contribution', 'color': '#4CAF50',
+        'metrics': {
+            'pressures_90': 'Pressures p90', 'pressure_regains_90': 'Pressure Regains p90',
+            'counterpressures_90': 'Counterpressures p90', 'aggressive_actions_90': 'Aggressive Actions',
+            'padj_tackles_90': 'P.Adj Tackles p90', 'dribbled_past_90': 'Times Dribbled Past p90'
+        }
+    }
+})
+
+WINGER_ARCHETYPES = _freeze({
+    "Goal-Scoring Winger": {
+        "description": "A winger focused on cutting inside to shoot and score goals, often functioning as a wide forward. They have a high goal threat and strong dribbling ability.",
+        "identity_metrics": ['npg_90', 'np_xg_90', 'np_shots_90', 'touches_inside_box_90', 'np_xg_per_shot', 'dribbles_90', 'over_under_performance_90', 'npxgxa_90', 'op_passes_into_box_90'],
+        "key_weight": 1.6
+    },
+    "Creative Playmaker": {
+        "description": "A winger who creates chances for others through key passes, crosses, and assists. They are a primary source of creativity from wide areas and often have a high xG buildup contribution.",
+        "identity_metrics": ['xa_90', 'key_passes_90', 'op_passes_into_box_90', 'through_balls_90', 'op_xgbuildup_90', 'deep_progressions_90', 'crosses_90', 'dribbles_90', 'fouls_won_90'],
+        "key_weight": 1.5
+    },
+    "Traditional Winger": {
+        "description": "A winger who focuses on providing width and stretching the opposition defense. Their primary actions are dribbling down the line and delivering crosses into the box.",
+        "identity_metrics": ['crosses_90', 'crossing_ratio', 'dribbles_90', 'carry_length', 'deep_progressions_90', 'fouls_won_90', 'op_passes_into_box_90', 'turnovers_90'],
+        "key_weight": 1.5
+    },
+    "Inverted Winger": {
+        "description": "A winger who plays on the opposite flank of their strong foot, allowing them to cut inside and create. They are defined by a high volume of successful dribbles and a strong role in ball progression and attacking buildup.",
+        "identity_metrics": ['dribbles_90', 'dribble_ratio', 'carries_90', 'carry_length', 'deep_progressions_90', 'op_xgbuildup_90', 'op_passes_into_box_90', 'xa_90'],
+        "key_weight": 1.6
+    }
+})
+
+WINGER_RADAR_METRICS = _freeze({
+    'goal_threat': {
+        'name': 'Goal Threat', 'color': '#D32F2F',
+        'metrics': {
+            'npg_90': 'Non-Penalty Goals', 'np_xg_90': 'Non-Penalty xG',
+            'np_shots_90': 'Shots p90', 'touches_inside_box_90': 'Touches in Box p90',
+            'conversion_ratio': 'Shot Conversion %', 'np_xg_per_shot': 'Avg. Shot Quality'
+        }
+    },
+    'creation': {
+        'name': 'Chance Creation', 'color': '#FF6B35',
+        'metrics': {
+            'key_passes_90': 'Key Passes p90', 'xa_90': 'xA p90',
+            'op_passes_into_box_90': 'Passes into Box p90', 'through_balls_90': 'Through Balls p90',
+            'op_xgbuildup_90': 'xG Buildup p90', 'passing_ratio': 'Pass Completion %'
+        }
+    },
+    'progression': {
+        'name': 'Dribbling & Progression', 'color': '#9C27B0',
+        'metrics': {
+            'dribbles_90': 'Successful Dribbles p90', 'dribble_ratio': 'Dribble Success %',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'deep_progressions_90': 'Deep Progressions p90', 'fouls_won_90': 'Fouls Won p90'
+        }
+    },
+    'crossing': {
+        'name': 'Crossing Profile', 'color': '#00BCD4',
+        'metrics': {
+            'crosses_90': 'Completed Crosses p90', 'crossing_ratio': 'Cross Completion %',
+            'box_cross_ratio': '% of Box Passes that are Crosses', 'op_passes_into_box_90': 'Passes into Box p90',
+            'key_passes_90': 'Key Passes p90', 'xa_90': 'xA p90'
+        }
+    },
+    'defensive': {
+        'name': 'Defensive Work Rate', 'color': '#4CAF50',
+        'metrics': {
+            'pressures_90': 'Pressures p90', 'pressure_regains_90': 'Pressure Regains p90',
+            'padj_tackles_90': 'P.Adj Tackles p90', 'padj_interceptions_90': 'P.Adj Interceptions p90',
+            'dribbled_past_90': 'Times Dribbled Past p90', 'aggressive_actions_90': 'Aggressive Actions'
+        }
+    },
+    'duels': {
+        'name': 'Duels & Security', 'color': '#607D8B',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won p90', 'aerial_ratio': 'Aerial Win %',
+            'challenge_ratio': 'Defensive Duel Win %', 'fouls_won_90': 'Fouls Won p90',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'turnovers_90': 'Ball Security (Inv)'
+        }
+    }
+})
+
+CM_ARCHETYPES = _freeze({
+    "Deep-Lying Playmaker (Regista)": {
+        "description": "A midfielder who dictates tempo from deep positions, excelling in progressive passing and ball distribution to start attacks. They are the team's engine from the defensive half.",
+        "identity_metrics": ['op_xgbuildup_90', 'long_balls_90', 'long_ball_ratio', 'forward_pass_proportion', 'passing_ratio', 'through_balls_90', 'op_f3_passes_90', 'carries_90'],
+        "key_weight": 1.6
+    },
+    "Box-to-Box Midfielder (B2B)": {
+        "description": "A high-energy midfielder who covers large vertical space on the pitch, contributing heavily in both attack and defense. They are involved in ball progression, tackling, and late runs into the box.",
+        "identity_metrics": ['deep_progressions_90', 'carries_90', 'padj_tackles_and_interceptions_90', 'pressures_90', 'npg_90', 'touches_inside_box_90', 'op_xgchain_90', 'offensive_duels_90'],
+        "key_weight": 1.6
+    },
+    "Ball-Winning Midfielder (Destroyer)": {
+        "description": "A defensive-minded midfielder who breaks up opposition attacks, screens the defense, and wins possession. They are defined by their tenacity and high volume of defensive actions.",
+        "identity_metrics": ['padj_tackles_90', 'padj_interceptions_90', 'pressure_regains_90', 'challenge_ratio', 'aggressive_actions_90', 'fouls_90', 'dribbled_past_90'],
+        "key_weight": 1.6
+    },
+    "Advanced Playmaker (Mezzala)": {
+        "description": "A creative midfielder who operates in the half-spaces and creates chances in advanced zones. They are excellent dribblers and key passers who often make runs into the final third.",
+        "identity_metrics": ['xa_90', 'key_passes_90', 'op_passes_into_box_90', 'through_balls_90', 'dribbles_90', 'np_shots_90', 'op_xgbuildup_90', 'deep_progressions_90'],
+        "key_weight": 1.5
+    },
+    "Holding Midfielder (Anchor)": {
+        "description": "A conservative midfielder who protects the backline and distributes the ball safely and efficiently. They are defined by their positional discipline and high pass completion rate.",
+        "identity_metrics": ['padj_interceptions_90', 'passing_ratio', 'op_xgbuildup_90', 'pressures_90', 'challenge_ratio', 'turnovers_90', 'padj_clearances_90', 's_pass_length'],
+        "key_weight": 1.5
+    },
+    "Attacking Midfielder (8.5 Role)": {
+        "description": "An aggressive, goal-oriented midfielder who operates closer to the opposition box, focusing on final-third involvement and attacking output, similar to a second striker.",
+        "identity_metrics": ['npg_90', 'np_xg_90', 'xa_90', 'key_passes_90', 'touches_inside_box_90', 'np_shots_90', 'op_passes_into_box_90', 'dribbles_90'],
+        "key_weight": 1.6
+    }
+})
+
+
+CM_RADAR_METRICS = _freeze({
+    'defending': {
+        'name': 'Defensive Actions', 'color': '#D32F2F',
+        'metrics': {
+            'padj_tackles_and_interceptions_90': 'P.Adj Tackles+Ints',
+            'challenge_ratio': 'Defensive Duel Win %',
+            'dribbled_past_90': 'Times Dribbled Past p90',
+            'aggressive_actions_90': 'Aggressive Actions',
+            'pressures_90': 'Pressures p90'
+        }
+    },
+    'duels': {
+        'name': 'Duels & Physicality', 'color': '#AF1D1D',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won', 'aerial_ratio': 'Aerial Win %',
+            'fouls_won_90': 'Fouls Won', 'challenge_ratio': 'Defensive Duel Win %',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'aggressive_actions_90': 'Aggressive Actions'
+        }
+    },
+    'passing': {
+        'name': 'Passing & Distribution', 'color': '#0066CC',
+        'metrics': {
+            'passing_ratio': 'Pass Completion %', 'forward_pass_proportion': 'Forward Pass %',
+            'long_balls_90': 'Long Balls p90', 'long_ball_ratio': 'Long Ball Accuracy %',
+            'op_xgbuildup_90': 'xG Buildup p90'
+        }
+    },
+    'creation': {
+        'name': 'Creativity & Creation', 'color': '#FF6B35',
+        'metrics': {
+            'key_passes_90': 'Key Passes p90', 'xa_90': 'xA p90',
+            'through_balls_90': 'Through Balls p90', 'op_xgbuildup_90': 'xG Buildup p90',
+            'op_passes_into_box_90': 'Passes into Box p90'
+        }
+    },
+    'progression': {
+        'name': 'Ball Progression', 'color': '#4CAF50',
+        'metrics': {
+            'deep_progressions_90': 'Deep Progressions', 'carries_90': 'Ball Carries p90',
+            'carry_length': 'Avg. Carry Length', 'dribbles_90': 'Successful Dribbles',
+            'dribble_ratio': 'Dribble Success %'
+        }
+    },
+    'attacking': {
+        'name': 'Attacking Output', 'color': '#9C27B0',
+        'metrics': {
+            'npg_90': 'Non-Penalty Goals', 'np_xg_90': 'Non-Penalty xG',
+            'np_shots_90': 'Shots p90', 'touches_inside_box_90': 'Touches in Box',
+            'np_xg_per_shot': 'Avg. Shot Quality'
+        }
+    }
+})
+
+FULLBACK_ARCHETYPES = _freeze({
+    "Attacking Fullback": {
+        "description": "An offensive-minded full-back with high attacking output, including crosses, key passes, and deep forward runs into the final third to create chances.",
+        "identity_metrics": ['xa_90', 'crosses_90', 'op_passes_into_box_90', 'deep_progressions_90', 'key_passes_90', 'op_xgbuildup_90', 'dribbles_90', 'fouls_won_90'],
+        "key_weight": 1.5
+    },
+    "Defensive Fullback": {
+        "description": "A traditional full-back with a solid defensive foundation, focusing on preventing attacks through tackling, interceptions, and aerial duels.",
+        "identity_metrics": ['padj_tackles_and_interceptions_90', 'challenge_ratio', 'aggressive_actions_90', 'pressures_90', 'aerial_wins_90', 'aerial_ratio', 'dribbled_past_90', 'padj_clearances_90'],
+        "key_weight": 1.5
+    },
+    "Modern Wingback": {
+        "description": "A high-energy, all-action player who contributes in both defense and attack. They possess high stamina and cover large distances, excelling in both progression and defensive work rate.",
+        "identity_metrics": ['deep_progressions_90', 'crosses_90', 'dribbles_90', 'padj_tackles_and_interceptions_90', 'pressures_90', 'xa_90', 'pressure_regains_90', 'op_xgbuildup_90'],
+        "key_weight": 1.6
+    },
+    "Inverted Fullback": {
+        "description": "A fullback who moves into central midfield areas when their team has possession, excelling at linking play and progressive passing from deep zones.",
+        "identity_metrics": ['passing_ratio', 'deep_progressions_90', 'op_xgbuildup_90', 'carries_90', 'forward_pass_proportion', 'padj_tackles_90', 'padj_interceptions_90', 'dribble_ratio'],
+        "key_weight": 1.7
+    }
+})
+
+FULLBACK_RADAR_METRICS = _freeze({
+    'defensive_actions': {
+        'name': 'Defensive Actions', 'color': '#00BCD4',
+        'metrics': {
+            'padj_tackles_and_interceptions_90': 'P.Adj Tackles+Ints p90',
+            'challenge_ratio': 'Defensive Duel Win %',
+            'dribbled_past_90': 'Times Dribbled Past p90',
+            'pressures_90': 'Pressures p90',
+            'aggressive_actions_90': 'Aggressive Actions p90'
+        }
+    },
+    'duels': {
+        'name': 'Duels', 'color': '#008294',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won p90', 'aerial_ratio': 'Aerial Win %',
+            'aggressive_actions_90': 'Aggressive Actions p90', 'fouls_won_90': 'Fouls Won p90',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length'
+        }
+    },
+    'progression_creation': {
+        'name': 'Progression & Creation', 'color': '#FF6B35',
+        'metrics': {
+            'deep_progressions_90': 'Deep Progressions p90', 'carries_90': 'Ball Carries p90',
+            'dribbles_90': 'Successful Dribbles p90', 'xa_90': 'xA p90',
+            'op_passes_into_box_90': 'Passes into Box p90'
+        }
+    },
+    'crossing': {
+        'name': 'Crossing', 'color': '#FFA735',
+        'metrics': {
+            'crosses_90': 'Completed Crosses p90', 'crossing_ratio': 'Cross Completion %',
+            'box_cross_ratio': '% of Box Passes that are Crosses', 'key_passes_90': 'Key Passes p90'
+        }
+    },
+    'passing': {
+        'name': 'Passing & Buildup', 'color': '#9C27B0',
+        'metrics': {
+            'passing_ratio': 'Pass Completion %', 'op_xgbuildup_90': 'xG Buildup p90',
+            'key_passes_90': 'Key Passes p90', 'forward_pass_proportion': 'Forward Pass %'
+        }
+    },
+    'work_rate': {
+        'name': 'Work Rate & Security', 'color': '#4CAF50',
+        'metrics': {
+            'pressures_90': 'Pressures p90', 'pressure_regains_90': 'Pressure Regains p90',
+            'turnovers_90': 'Ball Security (Inv)', 'dribbled_past_90': 'Times Dribbled Past p90'
+        }
+    }
+})
+
+CB_ARCHETYPES = _freeze({
+    "Ball-Playing Defender": {
+        "description": "A defender comfortable in possession, who initiates attacks from the back with progressive passing, long balls, and carries into midfield. They are defined by their on-ball ability.",
+        "identity_metrics": ['op_xgbuildup_90', 'passing_ratio', 'long_balls_90', 'long_ball_ratio', 'forward_pass_proportion', 'carries_90', 'deep_progressions_90', 'op_f3_passes_90'],
+        "key_weight": 1.5
+    },
+    "Stopper": {
+        "description": "An aggressive defender who steps out to challenge attackers and win the ball high up the pitch. They rely on their physical and combative qualities to break up play before it reaches the box.",
+        "identity_metrics": ['aggressive_actions_90', 'padj_tackles_90', 'challenge_ratio', 'pressures_90', 'aerial_wins_90', 'fouls_90', 'pressure_regains_90', 'dribbled_past_90'],
+        "key_weight": 1.6
+    },
+    "Covering Defender": {
+        "description": "A defender who reads the game well and relies on superior positioning and interceptions to sweep up behind the defensive line. They are defined by their intelligence and ability to recover the ball with minimal duels.",
+        "identity_metrics": ['padj_interceptions_90', 'padj_clearances_90', 'dribbled_past_90', 'pressure_regains_90', 'aerial_ratio', 'passing_ratio', 'turnovers_90', 'average_x_defensive_action'],
+        "key_weight": 1.5
+    },
+    "No-Nonsense Defender": {
+        "description": "A physical defender who prioritizes safety and direct action. They excel at aerial duels, clearances, and tackling, with minimal involvement in attacking buildup or ball progression.",
+        "identity_metrics": ['padj_clearances_90', 'aerial_wins_90', 'aerial_ratio', 'padj_tackles_90', 'aggressive_actions_90', 'op_xgbuildup_90', 'passing_ratio', 'turnovers_90'],
+        "key_weight": 1.7
+    }
+})
+
+CB_RADAR_METRICS = _freeze({
+    'ground_defending': {
+        'name': 'Ground Duels', 'color': '#D32F2F',
+        'metrics': {
+            'padj_tackles_90': 'PAdj Tackles', 'challenge_ratio': 'Challenge Success %',
+            'aggressive_actions_90': 'Aggressive Actions', 'pressures_90': 'Pressures p90'
+        }
+    },
+    'aerial_duels': {
+        'name': 'Aerial Duels & Clearances', 'color': '#4CAF50',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won', 'aerial_ratio': 'Aerial Win %',
+            'padj_clearances_90': 'PAdj Clearances', 'fouls_won_90': 'Fouls Won',
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length'
+        }
+    },
+    'passing_distribution': {
+        'name': 'Passing & Distribution', 'color': '#0066CC',
+        'metrics': {
+            'passing_ratio': 'Pass Completion %', 'pass_length': 'Avg. Pass Length',
+            'long_balls_90': 'Long Balls p90', 'long_ball_ratio': 'Long Ball Accuracy %',
+            'forward_pass_proportion': 'Forward Pass %'
+        }
+    },
+    'ball_progression': {
+        'name': 'Ball Progression', 'color': '#FFC107',
+        'metrics': {
+            'carries_90': 'Ball Carries p90', 'carry_length': 'Avg. Carry Length',
+            'deep_progressions_90': 'Deep Progressions', 'op_xgbuildup_90': 'xG Buildup p90'
+        }
+    },
+    'defensive_positioning': {
+        'name': 'Defensive Positioning', 'color': '#00BCD4',
+        'metrics': {
+            'padj_interceptions_90': 'PAdj Interceptions', 'dribbled_past_90': 'Times Dribbled Past p90',
+            'pressure_regains_90': 'Pressure Regains', 'turnovers_90': 'Ball Security (Inv)'
+        }
+    },
+    'on_ball_security': {
+        'name': 'On-Ball Security', 'color': '#607D8B',
+        'metrics': {
+            'turnovers_90': 'Ball Security (Inv)', 'op_xgbuildup_90': 'xG Buildup p90',
+            'fouls_90': 'Fouls Committed', 'passing_ratio': 'Pass Completion %'
+        }
+    }
+})
+
+GK_ARCHETYPES = _freeze({
+    "Sweeper-Keeper": {
+        "description": "A proactive goalkeeper who operates outside the penalty area, intercepting through balls, and participating in the team's buildup play with their feet.",
+        "identity_metrics": [
+            'avg_pass_length', 'long_ball_ratio', 'op_xgbuildup_90', 'defensive_actions_outside_box_90',
+            'padj_interceptions_90', 'carries_90', 'passing_ratio'
+        ],
+        "key_weight": 1.6
+    },
+    "Shot-Stopper": {
+        "description": "A traditional goalkeeper who excels at making saves and commanding the penalty box. Their primary strengths are reflexes, positioning, and preventing goals.",
+        "identity_metrics": [
+            'psxg_net_90', 'save_ratio', 'op_saves_90', 'aerial_ratio',
+            'aerial_wins_90', 'padj_clearances_90', 'penalty_save_ratio'
+        ],
+        "key_weight": 1.6
+    }
+})
+
+GK_RADAR_METRICS = _freeze({
+    'shot_stopping': {
+        'name': 'Shot-Stopping', 'color': '#D32F2F',
+        'metrics': {
+            'psxg_net_90': 'Goals Prevented p90',
+            'save_ratio': 'Save %',
+            'op_saves_90': 'Saves from Open Play p90',
+            'penalty_save_ratio': 'Penalty Save %',
+            'cross_claim_ratio': 'Cross Claim %'
+        }
+    },
+    'aerial_command': {
+        'name': 'Aerial Command', 'color': '#607D8B',
+        'metrics': {
+            'aerial_wins_90': 'Aerial Duels Won p90',
+            'aerial_ratio': 'Aerial Win %',
+            'cross_claim_ratio': 'Cross Claim %',
+            'padj_clearances_90': 'P.Adj Clearances p90',
+            'avg_x_defensive_action': 'Avg. Defensive Action Distance'
+        }
+    },
+    'distribution': {
+        'name': 'Distribution & Passing', 'color': '#0066CC',
+        'metrics': {
+            'passing_ratio': 'Pass Completion %',
+            'long_ball_ratio': 'Long Ball Accuracy %',
+            'avg_pass_length': 'Avg. Pass Length',
+            'op_xgbuildup_90': 'xG Buildup p90',
+            'launches_ratio': 'Launch Completion % (>=40yds)'
+        }
+    },
+    'sweeping': {
+        'name': 'Sweeping Actions', 'color': '#4CAF50',
+        'metrics': {
+            'defensive_actions_outside_box_90': 'Def. Actions Outside Box p90',
+            'avg_x_defensive_action': 'Avg. Defensive Action Distance',
+            'padj_interceptions_90': 'P.Adj Interceptions p90',
+            'pressures_90': 'Pressures p90'
+        }
+    }
+})
+
+POSITIONAL_CONFIGS = _freeze({
+    "Goalkeeper": {"archetypes": GK_ARCHETYPES, "radars": GK_RADAR_METRICS, "positions": ['Goalkeeper']},
+    "Fullback": {"archetypes": FULLBACK_ARCHETYPES, "radars": FULLBACK_RADAR_METRICS, "positions":
+                 ['Left Back', 'Left Wing Back', 'Right Back', 'Right Wing Back']},
+    "Center Back": {"archetypes": CB_ARCHETYPES, "radars": CB_RADAR_METRICS, "positions":
+                    ['Centre Back', 'Left Centre Back', 'Right Centre Back']},
+    "Center Midfielder": {"archetypes": CM_ARCHETYPES, "radars": CM_RADAR_METRICS, "positions": [
+        'Centre Attacking Midfielder', 'Centre Defensive Midfielder', 'Left Centre Midfielder',
+        'Left Defensive Midfielder', 'Right Centre Midfielder', 'Right Defensive Midfielder'
+    ]},
+    "Winger": {"archetypes": WINGER_ARCHETYPES, "radars": WINGER_RADAR_METRICS, "positions": [
+        'Left Attacking Midfielder', 'Left Midfielder', 'Left Wing',
+        'Right Attacking Midfielder', 'Right Midfielder', 'Right Wing'
+    ]},
+    "Striker": {"archetypes": STRIKER_ARCHETYPES, "radars": STRIKER_RADAR_METRICS, "positions": [
+        'Centre Forward', 'Left Centre Forward', 'Right Centre Forward', 'Secondary Striker'
+    ]}
+})
+
+
+# Lookups derived once from the configs: position -> group and each group's metric / column lists
+# (reversed so that, as in a first-match scan, the first group listing a position wins)
+POSITION_TO_GROUP = _freeze({
+    position: group for group, config in reversed(list(POSITIONAL_CONFIGS.items())) for position in config['positions']
+})
+
+# Union of identity metrics across a group's archetypes (the find_matches metric space)
+GROUP_IDENTITY_METRICS = _freeze({
+    group: sorted({m for archetype in config['archetypes'].values() for m in archetype['identity_metrics']})
+    for group, config in POSITIONAL_CONFIGS.items()
+})
+GROUP_RADAR_METRICS = _freeze({
+    group: sorted({m for radar in config['radars'].values() for m in radar['metrics']})
+    for group, config in POSITIONAL_CONFIGS.items()
+})
+GROUP_Z_COLS = _freeze({group: [f"{m}_z" for m in metrics] for group, metrics in GROUP_IDENTITY_METRICS.items()})
+GROUP_IDENTITY_PCT_COLS = _freeze({group: [f"{m}_pct" for m in metrics] for group, metrics in GROUP_IDENTITY_METRICS.items()})
+GROUP_RADAR_PCT_COLS = _freeze({group: [f"{m}_pct" for m in metrics] for group, metrics in GROUP_RADAR_METRICS.items()})
+
+ALL_METRICS_TO_PERCENTILE = tuple(sorted(
+    set().union(*GROUP_IDENTITY_METRICS.values()) | set().union(*GROUP_RADAR_METRICS.values())
+))
+
+# Metrics where a lower value is better; their percentiles are inverted
+NEGATIVE_STATS = ('turnovers_90', 'dispossessions_90', 'dribbled_past_90', 'fouls_90')
+
+
+# --- 4. DATA FETCHING & STORAGE ---
+
+def make_api_session(auth_credentials, pool_size=FETCH_MAX_WORKERS):
+    """Creates a keep-alive requests.Session with a connection pool sized for the fetch workers."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.auth = auth_credentials
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_with_retry(session, url, timeout, retries, backoff, headers=None):
+    """GETs a URL, retrying connection errors, timeouts and 5xx/429 responses with exponential backoff."""
+    import requests
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+            if response.status_code in (429, 500, 502, 503, 504) and attempt < retries:
+                time.sleep(backoff * (2 ** attempt))
+                continue
+            response.raise_for_status()
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+def fetch_player_stats(session, competition_seasons, base_url=STATSBOMB_API_URL, max_workers=FETCH_MAX_WORKERS,
+                       retries=FETCH_RETRIES, backoff=FETCH_BACKOFF, timeout=60, on_progress=None, validators=None):
+    """Downloads /player-stats for every (competition_id, season_id) pair with bounded concurrency.
+
+    `validators` maps (competition_id, season_id) to the {'etag', 'last_modified'} of a cached copy;
+    those requests are sent conditionally and a 304 comes back as status 'not_modified'.
+
+    Returns {(competition_id, season_id): {'status': 'ok' | 'not_modified' | 'failed', 'data', 'etag', 'last_modified'}}.
+    `on_progress(done, total, competition_id, season_id, ok)` is called from the calling thread
+    as each request finishes, so it is safe to drive Streamlit widgets from it.
+    """
+    validators = validators or {}
+    jobs = [(league_id, season_id) for league_id, season_ids in competition_seasons.items() for season_id in season_ids]
+    results = {}
+    if not jobs:
+        return results
+
+    def fetch_one(league_id, season_id):
+        url = f"{base_url}/v1/competitions/{league_id}/seasons/{season_id}/player-stats"
+        cached = validators.get((league_id, season_id)) or {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        response = _get_with_retry(session, url, timeout, retries, backoff, headers=headers or None)
+        result = {
+            "status": "ok", "data": None,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if response.status_code == 304:
+            result["status"] = "not_modified"
+            result["etag"] = result["etag"] or cached.get("etag")
+            result["last_modified"] = result["last_modified"] or cached.get("last_modified")
+        else:
+            result["data"] = response.json()
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+        futures = {executor.submit(fetch_one, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception:
+                results[key] = {"status": "failed", "data": None, "etag": None, "last_modified": None}
+            if on_progress is not None:
+                on_progress(done, len(jobs), key[0], key[1], results[key]["status"] != "failed")
+
+    return results
+
+
+_PARTITION_FILE_RE = re.compile(r"^player_stats_c(-?\d+)_s(-?\d+)_(\d+)\.parquet$")
+
+
+def list_cached_partitions(cache_dir=PLAYER_STATS_CACHE_DIR):
+    """Returns {(competition_id, season_id): (path, fetched_at)} for the newest file of every cached partition."""
+    partitions = {}
+    if not os.path.isdir(cache_dir):
+        return partitions
+    for filename in os.listdir(cache_dir):
+        match = _PARTITION_FILE_RE.match(filename)
+        if not match:
+            continue
+        key = (int(match.group(1)), int(match.group(2)))
+        fetched_at = int(match.group(3))
+        if key not in partitions or fetched_at > partitions[key][1]:
+            partitions[key] = (os.path.join(cache_dir, filename), fetched_at)
+    return partitions
+
+
+def read_cached_partition(path):
+    """Reads one cached partition; returns None if the file is unreadable."""
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return None
+
+
+def _partition_meta_path(competition_id, season_id, cache_dir):
+    return os.path.join(cache_dir, f"player_stats_c{competition_id}_s{season_id}.json")
+
+
+def read_partition_meta(competition_id, season_id, cache_dir=PLAYER_STATS_CACHE_DIR):
+    """Returns the sidecar metadata of a cached partition: {'etag', 'last_modified', 'version'}."""
+    try:
+        with open(_partition_meta_path(competition_id, season_id, cache_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cached_partition(df, competition_id, season_id, cache_dir=PLAYER_STATS_CACHE_DIR, fetched_at=None, etag=None,
+                           last_modified=None):
+    """Atomically writes a partition as Parquet keyed by competition, season and fetch time,
+    then removes older files for the same partition. Returns the path, or None if it could not be written.
+
+    The HTTP validators and a content version (the fetch time of this payload) go into a JSON sidecar.
+    """
+    fetched_at = int(time.time() if fetched_at is None else fetched_at)
+    prefix = f"player_stats_c{competition_id}_s{season_id}_"
+    path = os.path.join(cache_dir, f"{prefix}{fetched_at}.parquet")
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        with open(_partition_meta_path(competition_id, season_id, cache_dir), "w") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "version": fetched_at}, f)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    for filename in os.listdir(cache_dir):
+        if filename.startswith(prefix) and filename.endswith(".parquet") and os.path.join(cache_dir, filename) != path:
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+            except OSError:
+                pass
+    return path
+
+
+def touch_cached_partition(path, competition_id, season_id, cache_dir=PLAYER_STATS_CACHE_DIR, fetched_at=None):
+    """Marks a cached partition as freshly validated (e.g. after a 304) without rewriting its content."""
+    fetched_at = int(time.time() if fetched_at is None else fetched_at)
+    new_path = os.path.join(cache_dir, f"player_stats_c{competition_id}_s{season_id}_{fetched_at}.parquet")
+    try:
+        os.replace(path, new_path)
+    except OSError:
+        return path
+    return new_path
+
+
+def load_partitions(auth_credentials=None, cache_dir=PLAYER_STATS_CACHE_DIR, max_age=PLAYER_STATS_MAX_AGE,
+                    base_url=STATSBOMB_API_URL, on_progress=None):
+    """Loads every configured league/season from the on-disk store, refreshing only in-progress seasons.
+
+    Completed seasons are immutable once cached. Current seasons older than `max_age` are revalidated with
+    conditional requests, so an unchanged league costs a 304 instead of a full payload. Without
+    `auth_credentials` (or if the API cannot be reached) whatever is cached is served, however old.
+    Returns (partitions, versions, api_error): {(competition_id, season_id): DataFrame}, the content version
+    of each, and the exception raised by the API check (None if the API was reachable or not needed).
+    """
+    now = time.time()
+    cached = list_cached_partitions(cache_dir)
+    partitions = {}
+    versions = {}
+    to_fetch = {}
+    validators = {}
+    for league_id, season_ids in COMPETITION_SEASONS.items():
+        for season_id in season_ids:
+            key = (league_id, season_id)
+            entry = cached.get(key)
+            is_immutable = season_id not in CURRENT_SEASON_IDS
+            if entry is not None and (is_immutable or auth_credentials is None or now - entry[1] < max_age):
+                df_cached = read_cached_partition(entry[0])
+                if df_cached is not None:
+                    partitions[key] = df_cached
+                    versions[key] = read_partition_meta(league_id, season_id, cache_dir).get("version", entry[1])
+                    continue
+            elif entry is not None:
+                validators[key] = read_partition_meta(league_id, season_id, cache_dir)
+            if auth_credentials is not None:
+                to_fetch.setdefault(league_id, []).append(season_id)
+
+    api_error = None
+    if to_fetch:
+        import requests
+
+        session = make_api_session(auth_credentials)
+        try:
+            test_response = session.get(f"{base_url}/v4/competitions", timeout=30)
+            test_response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            api_error = e
+            results = {}
+        else:
+            results = fetch_player_stats(session, to_fetch, base_url=base_url, on_progress=on_progress,
+                                         validators=validators)
+        finally:
+            session.close()
+
+        for league_id, season_ids in to_fetch.items():
+            league_name = LEAGUE_NAMES.get(league_id, f"League {league_id}")
+            for season_id in season_ids:
+                key = (league_id, season_id)
+                result = results.get(key) or {"status": "failed"}
+                df_league = None
+                if result["status"] == "ok" and result["data"]:
+                    try:
+                        df_league = pd.json_normalize(result["data"])
+                    except Exception:
+                        df_league = None
+                if df_league is not None and not df_league.empty:
+                    df_league['league_name'] = league_name
+                    df_league['competition_id'] = league_id
+                    df_league['season_id'] = season_id
+                    fetched_at = int(time.time())
+                    write_cached_partition(df_league, league_id, season_id, cache_dir, fetched_at=fetched_at,
+                                           etag=result["etag"], last_modified=result["last_modified"])
+                    partitions[key] = df_league
+                    versions[key] = fetched_at
+                elif key in cached:
+                    # 304, or a failed refetch: keep serving the cached copy
+                    df_stale = read_cached_partition(cached[key][0])
+                    if df_stale is not None:
+                        if result["status"] == "not_modified":
+                            touch_cached_partition(cached[key][0], league_id, season_id, cache_dir)
+                        partitions[key] = df_stale
+                        versions[key] = read_partition_meta(league_id, season_id, cache_dir).get("version", cached[key][1])
+
+    return partitions, versions, api_error
+
+
+# --- 5. DATA PROCESSING ---
+
+def compute_group_percentiles(df, metrics, negative_stats=(), group_col='position_group', min_group_size=5):
+    """Percentile ranks (0-100) and z-scores for every metric within each position group, in one pass.
+
+    Ranks use the average method over each group's non-missing values, inverted for `negative_stats`;
+    z-scores use the group mean and population std (a constant metric scores 0). Groups smaller than
+    `min_group_size` get 0 for both. Returns a frame of `<metric>_pct` / `<metric>_z` columns aligned to `df`.
+    """
+    block = df[metrics].apply(pd.to_numeric, errors='coerce')
+    values = block.to_numpy(dtype=float)
+    codes, _ = pd.factorize(df[group_col], use_na_sentinel=False)
+    grouped = block.groupby(codes, sort=False)
+
+    # Rank each group's 2-D block at once (2-D DataFrame.rank is markedly faster than groupby().rank())
+    pct = np.empty_like(values)
+    order = np.argsort(codes, kind='stable')
+    for rows in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1):
+        if len(rows):
+            pct[rows] = pd.DataFrame(values[rows]).rank(pct=True).to_numpy(dtype=float)
+    negative_mask = np.isin(metrics, list(negative_stats))
+    pct[:, negative_mask] = 1.0 - pct[:, negative_mask]
+    pct *= 100.0
+
+    means = grouped.transform('mean').to_numpy(dtype=float)
+    stds = grouped.transform('std', ddof=0).to_numpy(dtype=float)
+    stds[stds < 10 * np.finfo(float).eps] = 1.0
+    z = (values - means) / stds
+
+    small_group = (np.bincount(codes) < min_group_size)[codes] if len(codes) else np.zeros(0, dtype=bool)
+    pct[small_group] = 0.0
+    z[small_group] = 0.0
+
+    columns = {}
+    for i, metric in enumerate(metrics):
+        columns[f'{metric}_pct'] = pct[:, i]
+        columns[f'{metric}_z'] = z[:, i]
+    return pd.DataFrame(columns, index=df.index)
+
+
+def archetype_affinity_col(group, archetype):
+    """Column holding every player's affinity to one position group's archetype."""
+    return f"affinity:{group}:{archetype}"
+
+
+def compute_archetype_affinities(df, position_configs=POSITIONAL_CONFIGS, group_col='position_group'):
+    """Every player's affinity to every archetype of every position group, in one pass.
+
+    Affinity is the mean of the archetype's identity-metric `_pct` values that are present and not NaN
+    (0 if there are none): one 0/1 metric x archetype membership matrix, multiplied with the `_pct` block
+    and with its not-NaN mask to get the NaN-aware sums and counts.
+    Returns float32 `archetype_affinity_col` columns, plus each player's best (`archetype`, `archetype_affinity`)
+    and second-best (`runner_up_archetype`, `runner_up_affinity`) archetype of their own position group.
+    """
+    archetype_keys = [(group, name) for group, config in position_configs.items() for name in config['archetypes']]
+    pct_cols = list(dict.fromkeys(
+        f"{m}_pct" for group, name in archetype_keys for m in position_configs[group]['archetypes'][name]['identity_metrics']
+        if f"{m}_pct" in df.columns
+    ))
+    col_pos = {col: i for i, col in enumerate(pct_cols)}
+    membership = np.zeros((len(pct_cols), len(archetype_keys)))
+    for j, (group, name) in enumerate(archetype_keys):
+        for m in position_configs[group]['archetypes'][name]['identity_metrics']:
+            if f"{m}_pct" in col_pos:
+                membership[col_pos[f"{m}_pct"], j] += 1
+
+    block = df[pct_cols].to_numpy(dtype=float)
+    present = ~np.isnan(block)
+    sums = np.where(present, block, 0.0) @ membership
+    counts = present.astype(float) @ membership
+    affinity = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0).astype(np.float32)
+
+    best = np.full(len(df), None, dtype=object)
+    best_score = np.full(len(df), np.nan, dtype=np.float32)
+    runner_up = np.full(len(df), None, dtype=object)
+    runner_up_score = np.full(len(df), np.nan, dtype=np.float32)
+    groups = df[group_col].astype(object).to_numpy()
+    for group in position_configs:
+        rows = np.flatnonzero(groups == group)
+        cols = np.array([j for j, (g, _) in enumerate(archetype_keys) if g == group])
+        if not len(rows) or not len(cols):
+            continue
+        names = np.array([archetype_keys[j][1] for j in cols], dtype=object)
+        scores = affinity[np.ix_(rows, cols)]
+        order = np.argsort(-scores, axis=1, kind='stable')
+        best[rows] = names[order[:, 0]]
+        best_score[rows] = np.take_along_axis(scores, order[:, :1], axis=1)[:, 0]
+        if len(cols) > 1:
+            runner_up[rows] = names[order[:, 1]]
+            runner_up_score[rows] = np.take_along_axis(scores, order[:, 1:2], axis=1)[:, 0]
+
+    columns = {archetype_affinity_col(group, name): affinity[:, j] for j, (group, name) in enumerate(archetype_keys)}
+    columns.update(archetype=best, archetype_affinity=best_score,
+                   runner_up_archetype=runner_up, runner_up_affinity=runner_up_score)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def compact_processed_frame(df, metrics, categorical_cols=CATEGORICAL_COLUMNS):
+    """Memory-compact copy of a processed frame.
+
+    Repeated strings become categoricals, and the derived `<metric>_pct` / `<metric>_z` columns are stored
+    as one float32 2-D block (all `_pct` columns, then all `_z` columns), so the z-scores sit in a single
+    contiguous array rather than in scattered float64 columns.
+    """
+    derived_cols = [f'{m}_pct' for m in metrics if f'{m}_pct' in df.columns]
+    derived_cols += [f'{m}_z' for m in metrics if f'{m}_z' in df.columns]
+    base = df.drop(columns=derived_cols)
+    for col in categorical_cols:
+        if col in base.columns and base[col].dtype == 'object':
+            base[col] = base[col].astype('category')
+
+    derived = pd.DataFrame(df[derived_cols].to_numpy(dtype=np.float32), index=df.index, columns=derived_cols)
+    return pd.concat([base, derived], axis=1, copy=False)
+
+
+def calculate_ages(birth_dates, as_of=None):
+    """Whole-year ages on `as_of` (default: today) for a column of 'YYYY-MM-DD' birth dates.
+
+    The column is parsed once with a fixed format; the other rows are parsed together with per-value format
+    inference, timezone-aware values as their UTC date. Missing or unparseable dates give NaN.
+    """
+    as_of = date.today() if as_of is None else as_of
+    birth_dates = pd.Series(birth_dates)
+    parsed = pd.to_datetime(birth_dates, format='%Y-%m-%d', errors='coerce')
+    retry = parsed.isna() & birth_dates.notna()
+    if retry.any():
+        retried = pd.to_datetime(birth_dates[retry], format='mixed', errors='coerce', utc=True)
+        parsed[retry] = retried.dt.tz_localize(None)
+
+    years = parsed.dt.year.to_numpy(dtype=float)
+    month_day = (parsed.dt.month * 100 + parsed.dt.day).to_numpy(dtype=float)
+    not_had_birthday = month_day > as_of.month * 100 + as_of.day
+    return pd.Series(as_of.year - years - not_had_birthday, index=birth_dates.index)
+
+
+def dataset_version(versions):
+    """Canonical data_version for {(competition_id, season_id): content version}, independent of fetch order.
+
+    Every process (app, batch CLI) must derive it the same way, or they key different feature stores.
+    """
+    return tuple(sorted(versions.items()))
+
+
+def feature_store_key(data_version):
+    """Short, stable directory name for one processed dataset version."""
+    return hashlib.sha1(repr((FEATURE_STORE_SCHEMA, data_version)).encode()).hexdigest()[:16]
+
+
+def write_feature_store(df, metrics, key, store_dir=FEATURE_STORE_DIR, group_col='position_group'):
+    """Writes a compact processed frame (see compact_processed_frame) as a memory-mappable dataset.
+
+    Layout of `<store_dir>/<key>/`:
+      - features.npy: float32 rows x [`_pct` columns | `_z` columns | other float32 columns (archetype affinities)],
+        column-major so every column is contiguous
+      - base.parquet: all other columns, with the frame's row IDs as the index
+      - manifest.json: feature columns and the [start, stop) row range of each position group
+
+    Every float32 column goes to features.npy: a float32 column left in base.parquet would make pandas consolidate
+    it with the memory-mapped block into a private, writable copy.
+
+    Rows must already be grouped by `group_col`, so each group's `_z` / `_pct` matrix is a slice of the file.
+    The directory is written under a temporary name and renamed into place; older versions beyond
+    FEATURE_STORE_KEEP are removed. Returns the directory, or None if it could not be written.
+    """
+    pct_cols = [f'{m}_pct' for m in metrics if f'{m}_pct' in df.columns]
+    z_cols = [f'{m}_z' for m in metrics if f'{m}_z' in df.columns]
+    other_cols = [c for c in df.columns if df[c].dtype == np.float32 and c not in pct_cols and c not in z_cols]
+    feature_cols = pct_cols + z_cols + other_cols
+    groups = {}
+    for group, rows in df.groupby(group_col, sort=False, observed=True).indices.items():
+        if rows[-1] - rows[0] + 1 != len(rows):
+            raise ValueError(f"rows of position group {group!r} are not contiguous")
+        groups[str(group)] = [int(rows[0]), int(rows[-1]) + 1]
+
+    path = os.path.join(store_dir, key)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "features.npy"), np.asfortranarray(df[feature_cols].to_numpy(dtype=np.float32)))
+        df.drop(columns=feature_cols).to_parquet(os.path.join(tmp_path, "base.parquet"), index=True)
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump({"pct_cols": pct_cols, "z_cols": z_cols, "other_cols": other_cols, "groups": groups,
+                       "n_rows": len(df)}, f)
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(path):  # another process may have published the same version first
+            return None
+
+    versions = sorted(
+        (entry for entry in os.scandir(store_dir) if entry.is_dir() and ".tmp-" not in entry.name),
+        key=lambda entry: entry.stat().st_mtime, reverse=True
+    )
+    for entry in versions[FEATURE_STORE_KEEP:]:
+        if entry.name != key:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return path
+
+
+# Group row bounds of every open store frame, keyed by the frame's identity. Not kept in `df.attrs`: pandas copies
+# attrs onto every slice and copy, whose rows the bounds do not describe.
+_store_group_rows = {}
+
+
+def open_feature_store(key, store_dir=FEATURE_STORE_DIR):
+    """Opens a stored processed dataset; returns the frame, or None if it is missing or unreadable.
+
+    The frame's float32 block (`_pct`, `_z` and affinity columns) is a read-only view of the memory-mapped
+    features.npy, so every process opening the same version shares one copy through the OS page cache.
+    Raises RuntimeError if the opened frame no longer holds that view.
+    """
+    path = os.path.join(store_dir, key)
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        features = np.load(os.path.join(path, "features.npy"), mmap_mode="r")
+        base = pd.read_parquet(os.path.join(path, "base.parquet"))
+    except (OSError, ValueError):
+        return None
+    feature_cols = manifest["pct_cols"] + manifest["z_cols"] + manifest.get("other_cols", [])
+    if features.shape != (manifest["n_rows"], len(feature_cols)) or len(base) != len(features):
+        return None
+
+    derived = pd.DataFrame(features, index=base.index, columns=feature_cols, copy=False)
+    df = pd.concat([base, derived], axis=1, copy=False)
+
+    # A float32 column outside features.npy would be consolidated with the block into a private writable copy
+    views = [df[col].to_numpy() for col in feature_cols[:1] + feature_cols[-1:]]
+    if (base.dtypes == np.float32).any() or any(v.flags.writeable or not np.shares_memory(v, features) for v in views):
+        raise RuntimeError(f"feature store {key}: feature block is not a read-only view of features.npy")
+    _store_group_rows[id(df)] = manifest["groups"]
+    weakref.finalize(df, _store_group_rows.pop, id(df), None)
+    return df
+
+
+def is_feature_store_frame(df):
+    """True for a frame returned by open_feature_store itself (not a slice or copy of one)."""
+    return id(df) in _store_group_rows
+
+
+def group_rows(df, group, group_col='position_group'):
+    """Rows of one position group; a zero-copy slice when the frame is a feature store frame."""
+    bounds = _store_group_rows.get(id(df), {}).get(group)
+    if bounds is not None:
+        return df.iloc[bounds[0]:bounds[1]]
+    return df[df[group_col] == group]
+
+
+def internal_distributions(df, metrics, group_col='position_group'):
+    """Sorted finite values, mean and population std of each metric within each position group.
+
+    Returns {group: {metric: (sorted_values, mean, std)}}; std is NaN for (near) constant metrics and
+    metrics with no finite values are left out. This is the reference used to project external rows.
+    """
+    present = [m for m in metrics if m in df.columns]
+    block = df[present].apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan)
+    distributions = {}
+    for group, rows in block.groupby(df[group_col], sort=False, observed=True):
+        values = rows.to_numpy(dtype=float)
+        per_metric = {}
+        for i, metric in enumerate(present):
+            col = values[:, i]
+            col = np.sort(col[~np.isnan(col)])
+            if not len(col):
+                continue
+            std = col.std()
+            per_metric[metric] = (col, col.mean(), std if std > 1e-9 else np.nan)
+        distributions[group] = per_metric
+    return distributions
+
+
+def get_canonical_season(season_str):
+    """
+    Intelligently extracts the canonical end year from a season string.
+    e.g., '2025' from '2024/2025' and '2025' from '2025'.
+    This allows grouping different season formats together.
+    """
+    try:
+        if isinstance(season_str, str) and '/' in season_str:
+            return int(season_str.split('/')[1])  # Take the END year
+        else:
+            return int(season_str)
+    except (ValueError, TypeError):
+        return 0
+
+
+def get_season_start_year(season_str):
+    """
+    Intelligently extracts the starting year from a season string (e.g., '2024' from '2024/2025' or '2025' from '2025').
+    This ensures correct chronological sorting.
+    """
+    try:
+        if isinstance(season_str, str) and '/' in season_str:
+            return int(season_str.split('/')[0])
+        else:
+            return int(season_str)
+    except (ValueError, TypeError):
+        return 0
+
+
+def prepare_partition_frame(raw_partition, as_of=None):
+    """Row-level derivations for one raw league/season partition: column names, trimmed labels,
+    ages on `as_of`, position groups, combined tackles + interceptions and the canonical season."""
+    df_part = raw_partition.copy()
+    df_part.columns = [c.replace('player_season_', '') for c in df_part.columns]
+
+    for col in ['player_name', 'team_name', 'league_name', 'season_name', 'primary_position']:
+        if col in df_part.columns and df_part[col].dtype == 'object':
+            df_part[col] = df_part[col].str.strip()
+
+    df_part['age'] = calculate_ages(df_part['birth_date'], as_of)
+
+    df_part['position_group'] = df_part['primary_position'].map(POSITION_TO_GROUP)
+
+    if 'padj_tackles_90' in df_part.columns and 'padj_interceptions_90' in df_part.columns:
+        df_part['padj_tackles_and_interceptions_90'] = (
+            df_part['padj_tackles_90'] + df_part['padj_interceptions_90']
+        )
+
+    if 'season_name' in df_part.columns:
+        df_part['canonical_season'] = df_part['season_name'].apply(get_canonical_season)
+
+    return df_part
+
+
+def process_partitions(prepared_partitions, compact=COMPACT_PROCESSED_DATA):
+    """Pools prepared partitions and adds per-position-group percentiles and z-scores for every metric,
+    then every player's archetype affinities (compute_archetype_affinities).
+
+    Metrics absent from the data are added as zeros. With `compact`, the frame is shrunk with
+    compact_processed_frame and its rows grouped by position group (the feature store layout).
+    """
+    df_processed = pd.concat(prepared_partitions, ignore_index=True)
+
+    missing_metrics = [m for m in ALL_METRICS_TO_PERCENTILE if m not in df_processed.columns]
+    present_metrics = [m for m in ALL_METRICS_TO_PERCENTILE if m in df_processed.columns]
+    derived = compute_group_percentiles(df_processed, present_metrics, NEGATIVE_STATS)
+    df_processed = pd.concat([
+        df_processed.drop(columns=[c for c in derived.columns if c in df_processed.columns]),
+        pd.DataFrame(0, index=df_processed.index, columns=missing_metrics),
+        derived
+    ], axis=1)
+
+    metric_cols = [col for col in df_processed.columns if '_90' in col or '_ratio' in col or 'length' in col]
+    pct_cols = [col for col in df_processed.columns if '_pct' in col]
+    z_cols = [col for col in df_processed.columns if '_z' in col]
+    cols_to_clean = list(set(metric_cols + pct_cols + z_cols))
+    df_processed[cols_to_clean] = df_processed[cols_to_clean].fillna(0)
+    df_processed = pd.concat([df_processed, compute_archetype_affinities(df_processed)], axis=1)
+
+    if compact:
+        df_processed = compact_processed_frame(df_processed, ALL_METRICS_TO_PERCENTILE)
+        # Keep each position group's rows together so its `_z` / `_pct` matrices are one slice on disk
+        df_processed = df_processed.sort_values('position_group', kind='stable', na_position='last')
+    return df_processed
+
+
+def load_processed_dataset(prepared_partition, data_version, as_of, compact=COMPACT_PROCESSED_DATA,
+                           store_dir=FEATURE_STORE_DIR):
+    """Processed dataset for one (data_version, as_of), shared through the feature store.
+
+    If another process already stored this version it is opened memory-mapped; otherwise the partitions are
+    processed (`prepared_partition(key, version)` returns one prepared partition) and, in compact mode,
+    written to the store and served from there.
+    """
+    store_key = feature_store_key((data_version, as_of))
+    if compact:
+        stored = open_feature_store(store_key, store_dir)
+        if stored is not None:
+            return stored
+
+    df_processed = process_partitions([prepared_partition(key, version) for key, version in data_version], compact)
+
+    if compact and write_feature_store(df_processed, ALL_METRICS_TO_PERCENTILE, store_key, store_dir) is not None:
+        stored = open_feature_store(store_key, store_dir)
+        if stored is not None:
+            return stored
+    return df_processed
+
+
+def player_display_labels(df):
+    """'Name (age, position)' labels for the player dropdowns, indexed like `df`."""
+    age = df['age'].to_numpy(dtype=float, na_value=np.nan)
+    age_str = pd.Series(np.where(np.isnan(age), 'N/A', np.nan_to_num(age).astype(int).astype(str)), index=df.index)
+    position = df['primary_position'].astype(object).fillna('N/A')
+    return df['player_name'].astype(object) + " (" + age_str + ", " + position + ")"
+
+
+def _picker_options(frame, keys):
+    """{key: (sorted labels, {label: first row})} for every `keys` group of a label-sorted picker frame.
+
+    Duplicate labels resolve to their first row in dataset order, as the pickers always have.
+    """
+    first = frame.drop_duplicates(keys + ['label'])
+    labels = first['label'].to_numpy()
+    rows = first.index.to_numpy()
+    options = {}
+    for key, positions in first.groupby(keys, sort=False).indices.items():
+        key_labels = labels[positions].tolist()
+        options[key] = (key_labels, dict(zip(key_labels, rows[positions].tolist())))
+    return options
+
+
+def build_picker_index(df, position_groups=POSITIONAL_CONFIGS):
+    """Cascading league -> season -> team -> player options for the player pickers, built once per dataset.
+
+    Returns a dict with:
+      - 'leagues': sorted league names; 'seasons': {league: seasons, newest first}
+      - 'positions': {(league, season): sorted primary positions}
+      - 'pools': {(league, season, group): {'teams': sorted teams, 'players': {team: (labels, {label: row})}}}
+        where group is None (unfiltered) or a position group, and team 'All Teams' covers the whole season.
+        Position-filtered pools with no players are left out.
+    """
+    frame = pd.DataFrame({
+        'league': df['league_name'].astype(object),
+        'season': df['season_name'].astype(object),
+        'team': df['team_name'].astype(object),
+        'position': df['primary_position'].astype(object),
+        'label': player_display_labels(df),
+        'order': np.arange(len(df)),
+    }, index=df.index).dropna(subset=['league', 'season', 'label'])
+
+    leagues = sorted(frame['league'].unique())
+    seasons = {
+        league: sorted(league_seasons.unique(), key=get_season_start_year, reverse=True)
+        for league, league_seasons in frame.groupby('league', sort=False)['season']
+    }
+    positions = {
+        key: sorted(season_positions.dropna().unique())
+        for key, season_positions in frame.groupby(['league', 'season'], sort=False)['position']
+    }
+
+    # One frame tagged with every pool a row belongs to ('' = unfiltered), sorted once by label
+    tagged = [frame.assign(group='')]
+    for group, config in position_groups.items():
+        tagged.append(frame[frame['position'].isin(config.get('positions', []))].assign(group=group))
+    tagged = pd.concat(tagged).sort_values(['label', 'order'], kind='mergesort')
+
+    season_players = _picker_options(tagged, ['league', 'season', 'group'])
+    team_players = _picker_options(tagged.dropna(subset=['team']), ['league', 'season', 'group', 'team'])
+
+    pools = {}
+    for (league, season, group), options in season_players.items():
+        pools[(league, season, group or None)] = {'teams': [], 'players': {"All Teams": options}}
+    for (league, season, group, team), options in team_players.items():
+        pool = pools[(league, season, group or None)]
+        pool['teams'].append(team)
+        pool['players'][team] = options
+    for pool in pools.values():
+        pool['teams'].sort()
+
+    return {'leagues': leagues, 'seasons': seasons, 'positions': positions, 'pools': pools}
+
+
+def build_search_pool(position_pool, search_scope, league_filter):
+    """Restricts a position group's rows to the selected season scope and league filter."""
+    canonical_seasons = sorted(position_pool['canonical_season'].unique(), reverse=True)
+
+    seasons_to_search = canonical_seasons
+    if search_scope == 'Last Season Only':
+        seasons_to_search = canonical_seasons[:1]
+    elif search_scope == 'Last 2 Seasons':
+        seasons_to_search = canonical_seasons[:2]
+
+    search_pool = position_pool[position_pool['canonical_season'].isin(seasons_to_search)]
+
+    # Apply league filter
+    if league_filter == "Domestic Leagues" and 'competition_id' in search_pool.columns:
+        search_pool = search_pool[search_pool['competition_id'].isin(DOMESTIC_LEAGUE_IDS)]
+    elif league_filter == "Scottish Leagues" and 'competition_id' in search_pool.columns:
+        search_pool = search_pool[search_pool['competition_id'].isin(SCOTTISH_LEAGUE_IDS)]
+    return search_pool
+
+
+def project_external_to_internal_distributions(internal_df: pd.DataFrame, external_df: pd.DataFrame, distributions=None):
+    """Projects external rows (e.g., open data) into the internal z/pct space per position_group.
+
+    - Uses internal distribution per position_group for each metric (pass `distributions` from
+      internal_distributions to reuse the sorted values across calls).
+    - Leaves missing metrics as NaN (critical for clone distance on shared dims).
+    - Applies the same negative-stat inversion used in process_data.
+    """
+    if external_df is None or external_df.empty:
+        return pd.DataFrame()
+
+    ext = external_df.copy()
+    # derive position_group with the same mapping
+    ext['position_group'] = ext.get('primary_position', pd.Series([None]*len(ext), index=ext.index)).map(POSITION_TO_GROUP)
+
+    if distributions is None:
+        distributions = internal_distributions(internal_df, ALL_METRICS_TO_PERCENTILE)
+
+    ext_group_rows = {
+        group: rows for group, rows in ext.groupby('position_group', sort=False).indices.items()
+        if group in distributions
+    }
+
+    columns = {}
+    for metric in ALL_METRICS_TO_PERCENTILE:
+        if metric in ext.columns:
+            x = pd.to_numeric(ext[metric], errors='coerce').to_numpy(dtype=float)
+        else:
+            x = np.full(len(ext), np.nan)
+            columns[metric] = x
+
+        pct = np.full(len(ext), np.nan)
+        z = np.full(len(ext), np.nan)
+        for group, rows in ext_group_rows.items():
+            stats = distributions[group].get(metric)
+            if stats is None:
+                continue
+            sorted_vals, mean, std = stats
+            rows = rows[~np.isnan(x[rows])]
+
+            # percentile within internal distribution: proportion of internal <= x
+            r = np.searchsorted(sorted_vals, x[rows], side='right') / len(sorted_vals)
+            pct[rows] = (1 - r) * 100 if metric in NEGATIVE_STATS else r * 100
+
+            if pd.notna(std):
+                z[rows] = (x[rows] - mean) / std
+
+        columns[f'{metric}_pct'] = pct
+        columns[f'{metric}_z'] = z
+
+    ext = ext.drop(columns=[c for c in columns if c in ext.columns])
+    return pd.concat([ext, pd.DataFrame(columns, index=ext.index)], axis=1)
+
+
+# --- 6. SIMILARITY ENGINE ---
+
+def fit_pool_covariance(X_complete, n_feat, ridge=1e-3):
+    """Covariance of the complete-case z-score matrix with sample-size dependent fallbacks.
+
+    Returns (cov, tier): LedoitWolf shrinkage when the sample is large enough, a ridged empirical
+    covariance for mid-sized pools, and a ridged correlation-based estimate for very small ones.
+    """
+    n_complete = len(X_complete)
+    if n_complete >= max(30, 2 * n_feat):
+        try:
+            from sklearn.covariance import LedoitWolf
+
+            lw = LedoitWolf()
+            lw.fit(X_complete)
+            return lw.covariance_, "ledoit_wolf"
+        except Exception:
+            cov = np.cov(X_complete, rowvar=False)
+            return cov + ridge * np.eye(n_feat, dtype=float), "empirical"
+    elif n_complete >= max(10, n_feat + 5):
+        cov = np.cov(X_complete, rowvar=False)
+        return cov + (2 * ridge) * np.eye(n_feat, dtype=float), "empirical"
+
+    # very small sample: diagonalized correlation fallback
+    X_frame = pd.DataFrame(X_complete)
+    corr = X_frame.corr().fillna(0.0).to_numpy()
+    stds = X_frame.std().fillna(1.0).to_numpy()
+    cov = np.outer(stds, stds) * corr
+    return cov + (3 * ridge) * np.eye(n_feat, dtype=float), "correlation"
+
+
+def whitening_from_precision(VI):
+    """Returns W with W.T @ W == VI, so Mahalanobis distance becomes Euclidean distance after x -> W @ x."""
+    eigvals, eigvecs = np.linalg.eigh((VI + VI.T) / 2.0)
+    return np.sqrt(np.clip(eigvals, 0.0, None))[:, None] * eigvecs.T
+
+
+_covariance_cache = OrderedDict()
+_covariance_cache_lock = threading.Lock()
+
+
+def pool_signature(row_ids, z_cols, X):
+    """Cache key of a pool's covariance: its row IDs, metric columns and the values of `X`.
+
+    Hashing the values makes a refreshed dataset that reuses the same row IDs miss instead of hitting stale
+    entries (it costs about as much as per-column checksums would, and far less than the fit).
+    """
+    digest = hashlib.sha1(pd.util.hash_array(np.asarray(row_ids)).tobytes())
+    digest.update(repr(list(z_cols)).encode())
+    digest.update(np.ascontiguousarray(X, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def pool_covariance(X, z_cols, row_ids=None):
+    """Covariance estimate of a pool's z-score matrix `X` (NaN = missing), fitted on its complete rows.
+
+    Returns {'cov', 'VI' (pseudo-inverse), 'W' (whitening, see whitening_from_precision), 'cov_tier'}. With the
+    pool's `row_ids` the estimate is shared through an LRU of COVARIANCE_CACHE_SIZE pools, so repeat searches
+    over the same pool skip the O(n * d^2) fit; the returned arrays are shared and must be treated as read-only.
+    """
+    key = pool_signature(row_ids, z_cols, X) if row_ids is not None and COVARIANCE_CACHE_SIZE > 0 else None
+    if key is not None:
+        with _covariance_cache_lock:
+            estimate = _covariance_cache.get(key)
+            if estimate is not None:
+                _covariance_cache.move_to_end(key)
+                return estimate
+
+    n_feat = len(z_cols)
+    cov, cov_tier = fit_pool_covariance(X[~np.isnan(X).any(axis=1)], n_feat)
+    try:
+        VI = np.linalg.pinv(cov)
+    except Exception:
+        VI = np.eye(n_feat, dtype=float)
+    estimate = {"cov": cov, "VI": VI, "W": whitening_from_precision(VI), "cov_tier": cov_tier}
+
+    if key is not None:
+        with _covariance_cache_lock:
+            _covariance_cache[key] = estimate
+            while len(_covariance_cache) > COVARIANCE_CACHE_SIZE:
+                _covariance_cache.popitem(last=False)
+    return estimate
+
+
+def build_similarity_index(pool_df, z_cols):
+    """Precomputes everything find_matches needs for a fixed candidate pool and metric space.
+
+    Holds the covariance inverse, its whitening matrix and the pool's whitened feature matrix (float32),
+    so scoring a target is a single matrix-vector product instead of a covariance refit. The covariance
+    comes from pool_covariance, so indices over the same pool share one fit.
+    """
+    X = pool_df[z_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    estimate = pool_covariance(X, z_cols, pool_df.index)
+    W = estimate["W"]
+
+    Y = (np.nan_to_num(X, nan=0.0) @ W.T).astype(np.float32)
+    return {
+        "z_cols": list(z_cols),
+        "row_index": pool_df.index,
+        "X": X.astype(np.float32),
+        "VI": estimate["VI"],
+        "W": W,
+        "Y": Y,
+        "Y_sq_norms": np.einsum("ij,ij->i", Y, Y, dtype=np.float64),
+        "cov_tier": estimate["cov_tier"],
+    }
+
+
+def build_archetype_index(df, position_configs=POSITIONAL_CONFIGS):
+    """Per (position group, archetype): the group's row labels and their affinities, highest affinity first.
+
+    Built once per dataset from the compute_archetype_affinities columns, so archetype_prefilter is a binary search.
+    """
+    archetype_index = {}
+    for group, config in position_configs.items():
+        rows = group_rows(df, group)
+        for name in config['archetypes']:
+            col = archetype_affinity_col(group, name)
+            if col not in rows.columns:
+                continue
+            affinity = rows[col].to_numpy(dtype=float)
+            order = np.argsort(-affinity, kind='stable')
+            archetype_index[(group, name)] = (rows.index[order], affinity[order])
+    return archetype_index
+
+
+def archetype_prefilter(archetype_index, target_player, archetype, margin=ARCHETYPE_PREFILTER_MARGIN,
+                        top_k=ARCHETYPE_PREFILTER_TOP_K):
+    """Row labels worth scoring for a target of `archetype` (find_matches' `candidate_rows`).
+
+    Keeps the target's position-group players whose affinity to the archetype is within `margin` of the target's
+    own (players similar to the target have similar affinities), plus the archetype's `top_k` players (upgrade
+    candidates). Both are slices of the affinity-sorted index. None (no prefilter) if the archetype is not indexed.
+    """
+    group = target_player.get('position_group')
+    entry = archetype_index.get((group, archetype))
+    col = archetype_affinity_col(group, archetype)
+    if entry is None or col not in target_player.index or pd.isna(target_player[col]):
+        return None
+
+    rows, affinity = entry
+    ascending = affinity[::-1]
+    target_affinity = float(target_player[col])
+    start = len(rows) - np.searchsorted(ascending, target_affinity + margin, side='right')
+    stop = len(rows) - np.searchsorted(ascending, target_affinity - margin, side='left')
+    top_k = min(top_k, len(rows))
+    if start <= top_k:
+        return rows[:max(stop, top_k)]
+    return rows[:top_k].append(rows[start:stop])
+
+
+def ann_shortlist(similarity_index, t_vec, candidate_pos, radius, k):
+    """Approximate nearest-neighbour shortlist in the index's whitened (Mahalanobis) space.
+
+    Returns positions into `candidate_pos` (index rows that are eligible for this query) covering every
+    candidate within `radius` of the target plus at least its `k` nearest eligible candidates.
+    The KD-tree is built on first use and kept on the index.
+    """
+    tree = similarity_index.get("tree")
+    if tree is None:
+        from scipy.spatial import cKDTree
+
+        tree = cKDTree(similarity_index["Y"])
+        similarity_index["tree"] = tree
+
+    n = tree.n
+    eligible = np.zeros(n, dtype=bool)
+    eligible[candidate_pos] = True
+    q = similarity_index["W"] @ t_vec
+
+    within = np.asarray(tree.query_ball_point(q, r=radius), dtype=int)
+
+    # Over-query when some neighbours are excluded (age filter, the target itself)
+    k = min(k, len(candidate_pos))
+    k_query = min(n, max(k, 1))
+    while True:
+        _, nearest = tree.query(q, k=k_query)
+        nearest = np.atleast_1d(nearest)
+        nearest = nearest[nearest < n]
+        if eligible[nearest].sum() >= k or k_query >= n:
+            break
+        k_query = min(n, k_query * 2)
+
+    selected = np.union1d(within, nearest)
+    selected = selected[eligible[selected]]
+    lookup = np.full(n, -1, dtype=int)
+    lookup[candidate_pos] = np.arange(len(candidate_pos))
+    return np.sort(lookup[selected])
+
+
+# Bit flags explaining why a candidate missed the 'True Clone' tier
+FAIL_DEFINING = 1
+FAIL_SIMILARITY = 2
+FAIL_COVERAGE = 4
+
+_FAIL_TAILS = np.array(["", "similarity floor", "low coverage", "similarity floor, low coverage"], dtype=object)
+
+
+def decode_fail_reasons(fail_flags, defining_match_count, defining_k):
+    """Turns find_matches fail flags into readable reasons, e.g. 'defining 3/6, low coverage'."""
+    fail_flags = np.asarray(fail_flags, dtype=int)
+    counts = np.asarray(defining_match_count, dtype=int).astype(str).astype(object)
+    head = np.where(fail_flags & FAIL_DEFINING, "defining " + counts + f"/{defining_k}", "")
+    tail = _FAIL_TAILS[(fail_flags & (FAIL_SIMILARITY | FAIL_COVERAGE)) >> 1]
+    sep = np.where(((fail_flags & FAIL_DEFINING) > 0) & (tail != ""), ", ", "")
+    return (head + sep + tail).astype(object)
+
+
+def _top_k_order(sort_keys, k):
+    """Positions of the top-k rows ordered by descending lexicographic keys (primary key first).
+
+    Uses argpartition on the primary key so only the shortlist is fully sorted.
+    """
+    n = len(sort_keys[0])
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=int)
+    primary = np.asarray(sort_keys[0], dtype=float)
+    if k < n:
+        shortlist = np.argpartition(-primary, k - 1)[:k]
+    else:
+        shortlist = np.arange(n)
+    order = np.lexsort(tuple(-np.asarray(key, dtype=float)[shortlist] for key in reversed(sort_keys)))
+    return shortlist[order]
+
+
+def find_matches(target_player, pool_df, archetype_config, season_df=None, search_mode="similar", min_minutes=600, top_n=100,
+                 similarity_index=None, approximate=False, candidate_rows=None):
+    """Two-tier similarity search.
+
+    Returns candidates in two tiers:
+      - True Clones: tight agreement on defining traits + high similarity + adequate coverage
+      - Next Best Fits: nearest neighbors filling the remaining slots
+
+    Always attempts to return enough rows to populate a Top 10 (when the pool has them),
+    while keeping the 'true clone' label honest.
+
+    Notes:
+      - Uses UNION of identity metrics across archetypes for the target's position_group (profile stability).
+      - Uses robust Mahalanobis distance (LedoitWolf) when sample size allows, with safe fallbacks. The covariance is
+        estimated on the minutes/position-qualified pool (target included) and cached by pool_covariance, so
+        consecutive searches over the same pool reuse it.
+      - Never treats missing metrics as 'average' for clone qualification; coverage is penalized.
+      - With a `similarity_index` (see build_similarity_index) covering the pool, its metric space and cached
+        covariance are reused and distances come from one product against the pre-whitened matrix.
+      - `approximate=True` (needs an index, only used for pools of ANN_MIN_POOL_SIZE+) scores a KD-tree shortlist
+        instead of the whole pool. The shortlist includes every candidate that could pass the clone similarity
+        floor, so 'True Clone' labels are exact; only the 'Next Best Fit' tail is approximate.
+      - `candidate_rows` (row labels, e.g. from archetype_prefilter) restricts scoring to those rows of the pool.
+        Unlike `approximate`, this can drop true clones; see archetype_prefilter for the trade-off.
+    """
+    if target_player is None or pool_df is None or pool_df.empty:
+        return pd.DataFrame()
+
+    # --- Pool filtering (row positions only; the pool itself is never copied) ---
+    keep = np.ones(len(pool_df), dtype=bool)
+    if "minutes" in pool_df.columns:
+        keep &= pool_df["minutes"].fillna(0).to_numpy(dtype=float) >= float(min_minutes)
+
+    tgt_group = target_player.get("position_group", None)
+    if tgt_group is not None and "position_group" in pool_df.columns:
+        keep &= (pool_df["position_group"] == tgt_group).to_numpy()
+
+    # The covariance is estimated on this pool, which is the same for every target (as in build_similarity_index)
+    pool_pos = np.flatnonzero(keep)
+
+    if "player_id" in pool_df.columns and "player_id" in target_player.index:
+        keep &= (pool_df["player_id"] != target_player["player_id"]).to_numpy()
+
+    if candidate_rows is not None:
+        keep &= pool_df.index.isin(candidate_rows)
+
+    cand_pos = np.flatnonzero(keep)
+    if len(cand_pos) == 0:
+        return pd.DataFrame()
+
+    # --- Metric space (UNION across archetypes in this position group) ---
+    z_cols = GROUP_Z_COLS.get(tgt_group) or [f"{m}_z" for m in archetype_config.get("identity_metrics", [])]
+
+    index_pos = None
+    if similarity_index is not None and all(
+            c in target_player.index and c in pool_df.columns for c in similarity_index["z_cols"]):
+        index_pos = similarity_index["row_index"].get_indexer(pool_df.index[cand_pos])
+        if (index_pos < 0).any():
+            index_pos = None  # pool has rows the index was not built on
+        else:
+            z_cols = similarity_index["z_cols"]
+
+    z_cols = [c for c in z_cols if c in pool_df.columns and c in target_player.index]
+    if not z_cols:
+        return pd.DataFrame()
+
+    # Parameters (sane defaults)
+    clone_def_k = int(archetype_config.get("clone_def_k", 6))
+    clone_def_k = max(4, min(10, clone_def_k, len(z_cols)))
+
+    clone_def_tol = float(archetype_config.get("clone_def_tol_z", 0.6))   # ± z window for defining metrics
+    clone_match_need = int(archetype_config.get("clone_match_need", clone_def_k - 1))  # e.g., 5/6
+    clone_match_need = max(2, min(clone_def_k, clone_match_need))
+
+    clone_sim_floor = float(archetype_config.get("clone_sim_floor", 60.0))
+    clone_cov_floor = float(archetype_config.get("clone_cov_floor", 0.70))
+
+    t = pd.to_numeric(target_player[z_cols], errors="coerce").to_numpy(dtype=float)
+
+    want = int(max(10, top_n))
+    if approximate and index_pos is not None and len(cand_pos) >= ANN_MIN_POOL_SIZE:
+        # similarity <= 100 * exp(-d / 2), so no clone can lie further out than this radius
+        clone_radius = 2.0 * np.log(100.0 / max(clone_sim_floor, 1e-6)) + 1e-3
+        shortlist = ann_shortlist(
+            similarity_index, np.nan_to_num(t, nan=0.0), index_pos, clone_radius, max(ANN_CANDIDATES, 5 * want)
+        )
+        cand_pos = cand_pos[shortlist]
+        index_pos = index_pos[shortlist]
+
+    if index_pos is not None:
+        X = similarity_index["X"][index_pos].astype(float)
+    else:
+        pool_X = pool_df.iloc[pool_pos, pool_df.columns.get_indexer(z_cols)].apply(
+            pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        X = pool_X[np.searchsorted(pool_pos, cand_pos)]
+
+    # --- Coverage (shared observed dimensions) ---
+    cand_cov = (~np.isnan(X)).mean(axis=1)
+    tgt_cov = float((~np.isnan(t)).mean()) if len(t) else 0.0
+    combined_cov = (cand_cov * tgt_cov) ** 0.5
+
+    # --- Defining traits (top-K spikes in abs z) ---
+    t_filled = np.nan_to_num(t, nan=0.0)
+    defining = np.argsort(-np.abs(t_filled), kind="stable")[:clone_def_k]
+
+    # Count defining agreements
+    def_diffs = np.abs(X[:, defining] - t_filled[defining])
+    def_match_count = (def_diffs <= clone_def_tol).sum(axis=1)
+
+    # A soft defining match score for ranking ties
+    defining_match_score = np.exp(-np.nanmean(def_diffs, axis=1))  # 1 is best
+
+    # --- Robust distance (Mahalanobis when possible) ---
+    if index_pos is not None:
+        # ||W(x - t)||^2 expanded so the whole pool is scored with one matrix-vector product
+        q = similarity_index["W"] @ t_filled
+        Y = similarity_index["Y"][index_pos]
+        mahal_sq = similarity_index["Y_sq_norms"][index_pos] - 2.0 * (Y @ q.astype(np.float32)) + float(q @ q)
+        dists = np.sqrt(np.maximum(mahal_sq, 0.0))
+    else:
+        W = pool_covariance(pool_X, z_cols, pool_df.index[pool_pos])["W"]
+
+        diffs = np.nan_to_num(X, nan=0.0) - t_filled.reshape(1, -1)
+
+        try:
+            # diffs' VI diffs == ||diffs W'||^2 (W' W == VI): one BLAS product instead of a three-operand einsum
+            whitened = diffs @ W.T
+            mahal_sq = np.einsum("ij,ij->i", whitened, whitened)
+            mahal_sq = np.maximum(mahal_sq, 0.0)
+            dists = np.sqrt(mahal_sq)
+        except Exception:
+            dists = np.linalg.norm(diffs, axis=1)
+
+    # --- Similarity score (0..100) ---
+    base_sim = 100.0 * np.exp(-0.50 * dists)
+    sim = base_sim * (combined_cov ** 0.85)
+    sim = sim * (0.85 + 0.15 * defining_match_score)
+    sim = np.clip(sim, 0.0, 100.0)
+
+    # --- Two-tier labeling (reasons kept as bit flags, decoded only for returned rows) ---
+    fail_flags = (
+        np.where(def_match_count < clone_match_need, FAIL_DEFINING, 0) |
+        np.where(sim < clone_sim_floor, FAIL_SIMILARITY, 0) |
+        np.where(combined_cov < clone_cov_floor, FAIL_COVERAGE, 0)
+    )
+    is_clone = fail_flags == 0
+
+    # --- Ranking / output ---
+    # Always build a Top 10 view (or more if requested); only the top of each tier is sorted
+    rank_keys = [sim, def_match_count, combined_cov]
+    clone_pos = np.flatnonzero(is_clone)
+    picked = clone_pos[_top_k_order([k[clone_pos] for k in rank_keys], want)]
+    if len(picked) < want:
+        neighbor_pos = np.flatnonzero(~is_clone)
+        picked = np.concatenate([
+            picked, neighbor_pos[_top_k_order([k[neighbor_pos] for k in rank_keys], want - len(picked))]
+        ])
+
+    res = pool_df.iloc[cand_pos[picked]].copy()
+    res["similarity_score"] = sim[picked]
+    res["_coverage"] = combined_cov[picked]
+    res["_defining_match_score"] = defining_match_score[picked]
+    res["_defining_match_count"] = def_match_count[picked]
+    res["_defining_k"] = clone_def_k
+    res["_defining_tol_z"] = clone_def_tol
+    res["_mahal_dist"] = dists[picked]
+    res["match_tier"] = np.where(is_clone[picked], "True Clone", "Next Best Fit")
+
+    # Fail reasons for transparency (helps you tune profile traits without guessing)
+    res["_fail_flags"] = fail_flags[picked].astype(np.int8)
+    res["_fail_reason"] = decode_fail_reasons(fail_flags[picked], def_match_count[picked], clone_def_k)
+
+    # Preserve upgrade mode behavior (if UI uses it)
+    if search_mode == "upgrade":
+        # For upgrade mode, we *still* keep clone-first ordering, but surface upgrade_score for sorting within tiers.
+        pct_cols = GROUP_IDENTITY_PCT_COLS.get(tgt_group) or [
+            f"{m}_pct" for m in archetype_config.get("identity_metrics", [])
+        ]
+        pct_cols = [c for c in pct_cols if c in res.columns]
+        if pct_cols:
+            res["upgrade_score"] = res[pct_cols].apply(pd.to_numeric, errors="coerce").mean(axis=1)
+            res = res.assign(_is_neighbor=res["match_tier"] != "True Clone").sort_values(
+                ["_is_neighbor", "upgrade_score", "similarity_score"],
+                ascending=[True, False, False]
+            ).drop(columns="_is_neighbor")
+
+    return res
+
+
+def _union_identity_metrics(position_group, archetype_config):
+    """Union of identity metrics across the position group's archetypes (the find_matches metric space)."""
+    return GROUP_IDENTITY_METRICS.get(position_group) or list(archetype_config.get("identity_metrics", []))
+
+
+def find_matches_batch(targets_df, pool_df, archetype_config=None, min_minutes=600, top_n=100, metrics_by_group=None,
+                       chunk_size=32, candidate_rows=None):
+    """Similarity search for many targets at once, returned as one long-format table.
+
+    Targets are grouped by position_group; each group shares a single similarity index (one covariance fit)
+    and all of its targets are scored with one matrix product against the whitened pool. Scoring, clone
+    qualification and tiering follow find_matches (similar mode). `metrics_by_group` optionally overrides
+    the metric space per position group. `candidate_rows` (row labels, e.g. an age filter) restricts which pool
+    rows can be returned; the covariance is still fitted on the whole minutes-qualified pool, as with a cached index.
+
+    Each result row is a pool row plus `target_index`, `target_player_id`, `target_player_name`,
+    `match_rank`, `match_tier`, `similarity_score`, `_coverage`, `_defining_match_count` and `_mahal_dist`.
+    """
+    archetype_config = archetype_config or {}
+    if targets_df is None or targets_df.empty or pool_df is None or pool_df.empty:
+        return pd.DataFrame()
+
+    pool = pool_df
+    if "minutes" in pool.columns:
+        pool = pool[pool["minutes"].fillna(0) >= float(min_minutes)]
+
+    want = int(max(10, top_n))
+    clone_sim_floor = float(archetype_config.get("clone_sim_floor", 60.0))
+    clone_cov_floor = float(archetype_config.get("clone_cov_floor", 0.70))
+    clone_def_tol = float(archetype_config.get("clone_def_tol_z", 0.6))
+
+    results = []
+    for group, targets_g in targets_df.groupby("position_group", sort=False, observed=True):
+        cand = pool[pool["position_group"] == group]
+        metrics = (metrics_by_group or {}).get(group) or _union_identity_metrics(group, archetype_config)
+        z_cols = [f"{m}_z" for m in metrics if f"{m}_z" in cand.columns and f"{m}_z" in targets_g.columns]
+        if cand.empty or not z_cols:
+            continue
+
+        index = build_similarity_index(cand, z_cols)
+        X = index["X"].astype(float)
+        X_observed = ~np.isnan(X)
+        cand_cov = X_observed.mean(axis=1)
+        cand_ids = cand["player_id"].to_numpy() if "player_id" in cand.columns else None
+        cand_allowed = cand.index.isin(candidate_rows) if candidate_rows is not None else np.ones(len(cand), dtype=bool)
+
+        clone_def_k = int(archetype_config.get("clone_def_k", 6))
+        clone_def_k = max(4, min(10, clone_def_k, len(z_cols)))
+        clone_match_need = int(archetype_config.get("clone_match_need", clone_def_k - 1))
+        clone_match_need = max(2, min(clone_def_k, clone_match_need))
+
+        for start in range(0, len(targets_g), chunk_size):
+            chunk = targets_g.iloc[start:start + chunk_size]
+            T = chunk[z_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            tgt_cov = (~np.isnan(T)).mean(axis=1)
+            T_filled = np.nan_to_num(T, nan=0.0)
+
+            # Mahalanobis distances for the whole chunk: one GEMM against the whitened pool
+            Q = T_filled @ index["W"].T
+            mahal_sq = (index["Y_sq_norms"][None, :] - 2.0 * (Q.astype(np.float32) @ index["Y"].T)
+                        + np.einsum("ij,ij->i", Q, Q)[:, None])
+            dists = np.sqrt(np.maximum(mahal_sq, 0.0))
+
+            combined_cov = np.sqrt(tgt_cov[:, None] * cand_cov[None, :])
+
+            # Defining traits: each target's top-K |z| metrics, compared across the pool one trait at a time so only
+            # pool x chunk arrays are live (a pool x chunk x K block is hundreds of MB for large pools)
+            defining = np.argsort(-np.abs(T_filled), axis=1, kind="stable")[:, :clone_def_k]
+            def_match_count = np.zeros((len(X), len(chunk)), dtype=int)
+            def_diff_sum = np.zeros((len(X), len(chunk)))
+            def_diff_n = np.zeros((len(X), len(chunk)), dtype=int)
+            for j in range(defining.shape[1]):
+                diff = np.abs(X[:, defining[:, j]] - T_filled[np.arange(len(chunk)), defining[:, j]][None, :])
+                observed = ~np.isnan(diff)
+                def_match_count += diff <= clone_def_tol
+                def_diff_sum += np.where(observed, diff, 0.0)
+                def_diff_n += observed
+            def_match_count = def_match_count.T
+            mean_def_diff = np.divide(def_diff_sum, def_diff_n, out=np.full(def_diff_sum.shape, np.nan),
+                                      where=def_diff_n > 0)
+            defining_match_score = np.exp(-mean_def_diff).T
+
+            sim = 100.0 * np.exp(-0.50 * dists) * combined_cov ** 0.85 * (0.85 + 0.15 * defining_match_score)
+            sim = np.clip(sim, 0.0, 100.0)
+            is_clone = (def_match_count >= clone_match_need) & (sim >= clone_sim_floor) & (combined_cov >= clone_cov_floor)
+
+            for i, (target_label, target) in enumerate(chunk.iterrows()):
+                eligible = cand_allowed.copy()
+                if cand_ids is not None and "player_id" in chunk.columns:
+                    eligible &= cand_ids != target["player_id"]
+
+                rank_keys = [sim[i], def_match_count[i], combined_cov[i]]
+                clone_pos = np.flatnonzero(is_clone[i] & eligible)
+                picked = clone_pos[_top_k_order([k[clone_pos] for k in rank_keys], want)]
+                if len(picked) < want:
+                    neighbor_pos = np.flatnonzero(~is_clone[i] & eligible)
+                    picked = np.concatenate([
+                        picked, neighbor_pos[_top_k_order([k[neighbor_pos] for k in rank_keys], want - len(picked))]
+                    ])
+
+                rows = cand.iloc[picked].copy()
+                rows.insert(0, "target_index", target_label)
+                rows.insert(1, "target_player_id", target.get("player_id"))
+                rows.insert(2, "target_player_name", target.get("player_name"))
+                rows.insert(3, "match_rank", np.arange(1, len(picked) + 1))
+                rows["match_tier"] = np.where(is_clone[i][picked], "True Clone", "Next Best Fit")
+                rows["similarity_score"] = sim[i][picked]
+                rows["_coverage"] = combined_cov[i][picked]
+                rows["_defining_match_count"] = def_match_count[i][picked]
+                rows["_mahal_dist"] = dists[i][picked]
+                results.append(rows)
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True)
+
+
+# Letters NFKD does not decompose into a base letter + accent
+_NAME_FOLDS = str.maketrans({'ø': 'o', 'ł': 'l', 'đ': 'd', 'ð': 'd', 'ı': 'i', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe',
+                             'þ': 'th', "'": None, '’': None})
+
+
+def normalize_player_name(name):
+    """Lower-cased, accent-folded name with punctuation collapsed to single spaces ('Kristoffer Ajer')."""
+    folded = unicodedata.normalize('NFKD', str(name).casefold().translate(_NAME_FOLDS))
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', folded).split())
+
+
+def _name_trigrams(normalized):
+    """Word trigrams, padded like pg_trgm ('  a', ' ab', 'abc', 'bc ') so short names and word starts count."""
+    grams = set()
+    for token in normalized.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def build_name_index(df):
+    """Search index over `player_name`, built once per dataset.
+
+    One entry per normalized name, holding its rows newest season first (then most minutes). Entries are
+    reachable by exact normalized name, by token prefix (sorted token array) and by trigram (inverted index).
+    """
+    names = df['player_name'].astype(object)
+    order = df.index
+    sort_cols = [c for c in ('canonical_season', 'minutes') if c in df.columns]
+    if sort_cols:
+        order = df.sort_values(sort_cols, ascending=False, kind='mergesort', na_position='last').index
+
+    keys = names.dropna().drop_duplicates()
+    normalized = pd.Series([normalize_player_name(n) for n in keys], index=keys.to_numpy())
+    entry_keys = pd.unique(normalized[normalized != ''])
+    entry_of_key = {key: i for i, key in enumerate(entry_keys)}
+
+    row_entries = names.loc[order].map(normalized).map(entry_of_key).dropna().astype(int)
+    rows = [[] for _ in entry_keys]
+    for row, entry in zip(row_entries.index, row_entries.to_numpy()):
+        rows[entry].append(row)
+
+    postings, tokens, token_entries, trigram_counts = {}, [], [], np.empty(len(entry_keys), dtype=np.int32)
+    for entry, key in enumerate(entry_keys):
+        grams = _name_trigrams(key)
+        trigram_counts[entry] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(entry)
+        for token in set(key.split()):
+            tokens.append(token)
+            token_entries.append(entry)
+    token_order = np.argsort(tokens, kind='mergesort')
+
+    return {
+        'names': [names.loc[entry_rows[0]] for entry_rows in rows],
+        'rows': rows,
+        'exact': entry_of_key,
+        'trigrams': {gram: np.asarray(entries, dtype=np.int32) for gram, entries in postings.items()},
+        'trigram_counts': trigram_counts,
+        'tokens': np.asarray(tokens, dtype=object)[token_order],
+        'token_entries': np.asarray(token_entries, dtype=np.int32)[token_order],
+    }
+
+
+def search_player_names(name_index, query, limit=10, min_score=0.3):
+    """Ranked `(rows, score)` hits for a free-text (partial, misspelt or unaccented) name query.
+
+    score = trigram similarity (mean of Jaccard and the share of the query's trigrams found in the name)
+    + 0.5 x share of query words that start a word of the name + 1 for an exact normalized match,
+    so 'messi', 'lionel mes' and 'lionel mesi' all find 'Lionel Messi'.
+    """
+    normalized = normalize_player_name(query) if query else ''
+    n_entries = len(name_index['rows'])
+    if not normalized or not n_entries:
+        return []
+
+    grams = _name_trigrams(normalized)
+    hits = [name_index['trigrams'][g] for g in grams if g in name_index['trigrams']]
+    overlap = np.bincount(np.concatenate(hits), minlength=n_entries) if hits else np.zeros(n_entries, dtype=np.int64)
+    score = 0.5 * (overlap / (len(grams) + name_index['trigram_counts'] - overlap) + overlap / len(grams))
+
+    query_tokens = normalized.split()
+    tokens = name_index['tokens']
+    prefix_hits = np.zeros(n_entries)
+    for token in query_tokens:
+        lo, hi = np.searchsorted(tokens, [token, token + '\uffff'])
+        starts_word = np.zeros(n_entries, dtype=bool)
+        starts_word[name_index['token_entries'][lo:hi]] = True
+        prefix_hits += starts_word
+    score += 0.5 * prefix_hits / len(query_tokens)
+
+    exact = name_index['exact'].get(normalized)
+    if exact is not None:
+        score[exact] += 1.0
+
+    candidates = np.flatnonzero(score >= min_score)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-score[candidates], limit - 1)[:limit]]
+    candidates = sorted(candidates, key=lambda e: (-score[e], name_index['names'][e]))
+    return [(name_index['rows'][e], float(score[e])) for e in candidates]
+
+
+def find_player_by_name(df, player_name, name_index=None):
+    """(row, None) for an exact (case- and accent-insensitive) name, else (None, up to 5 suggestions or None).
+
+    Pass a prebuilt `name_index` for `df` when looking up more than one name.
+    """
+    if not player_name: return None, None
+    if name_index is None:
+        name_index = build_name_index(df)
+
+    exact = name_index['exact'].get(normalize_player_name(player_name))
+    if exact is not None: return df.loc[name_index['rows'][exact][0]].copy(), None
+
+    hits = search_player_names(name_index, player_name, limit=5)
+    if hits:
+        suggestions = df.loc[[rows[0] for rows, _ in hits], ['player_name', 'team_name']].to_dict('records')
+        return None, suggestions
+    return None, None
+
+
+def detect_player_archetype(target_player, archetypes, position_group=None):
+    """Best archetype and the player's archetype DNA ('Archetype', 'Affinity Score', highest first).
+
+    When `position_group` names the group `archetypes` belong to and the row carries the precomputed
+    affinity columns (see compute_archetype_affinities), the scores are a lookup; otherwise they are averaged
+    from the row's `_pct` values.
+    """
+    affinity_cols = {name: archetype_affinity_col(position_group, name) for name in archetypes} if position_group else {}
+    if affinity_cols and all(col in target_player.index for col in affinity_cols.values()):
+        archetype_scores = {name: float(target_player[col]) for name, col in affinity_cols.items()}
+    else:
+        archetype_scores = {}
+        for name, config in archetypes.items():
+            metrics = [f"{m}_pct" for m in config['identity_metrics']]
+            valid_metrics = [m for m in metrics if m in target_player.index and pd.notna(target_player[m])]
+            score = target_player[valid_metrics].mean() if valid_metrics else 0
+            archetype_scores[name] = score
+
+    best_archetype = max(archetype_scores, key=archetype_scores.get) if archetype_scores else None
+    return best_archetype, pd.DataFrame(archetype_scores.items(), columns=['Archetype', 'Affinity Score']).sort_values(by='Affinity Score', ascending=False)
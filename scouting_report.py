@@ -0,0 +1,390 @@
+# ----------------------------------------------------------------------
+# ⚽ Scouting Report Engine ⚽
+#
+# Builds the .docx scouting report shared by the Streamlit app (download
+# button) and the interactive CLI. Radar images are rendered in a process
+# pool, kept in an on-disk image cache so repeat reports reuse them, and
+# streamed into python-docx from memory (no temporary files).
+# ----------------------------------------------------------------------
+
+# --- 1. IMPORTS ---
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# --- 2. CONFIGURATION ---
+REPORT_DPI = int(os.getenv("REPORT_DPI", "150"))  # the original 300 dpi is ~4x the pixels for a 2.3in image
+REPORT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+RADAR_IMAGE_CACHE_DIR = os.getenv(
+    "RADAR_IMAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "radar_images"),
+)
+# Least recently used images are removed once the cache grows past this size
+RADAR_IMAGE_CACHE_MAX_BYTES = int(os.getenv("RADAR_IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+# --- 3. RADAR IMAGES ---
+def _percentile_values(player, metrics):
+    """Clamped percentiles for the radar's metrics; missing values are drawn at 50."""
+    values = []
+    for m in metrics:
+        value = player.get(f'{m}_pct', 50)
+        values.append(50.0 if pd.isna(value) else float(max(0, min(100, value))))
+    return values
+
+
+def radar_payload(player, reference_player, radar_config):
+    """Everything needed to draw one radar, as plain (picklable, hashable) data."""
+    metrics_dict = radar_config['metrics']
+    payload = {
+        'name': radar_config['name'],
+        'color': radar_config['color'],
+        'labels': ['\n'.join(label.split()) for label in metrics_dict.values()],
+        'player_name': str(player['player_name']),
+        'values': _percentile_values(player, metrics_dict),
+        'reference_name': None,
+        'reference_values': None,
+    }
+    if reference_player is not None:
+        payload['reference_name'] = str(reference_player['player_name'])
+        payload['reference_values'] = _percentile_values(reference_player, metrics_dict)
+    return payload
+
+
+def radar_cache_key(player, reference_player, radar_key, payload, dpi):
+    """Image cache key: (player_id, season_id, radar, reference player, dpi) plus the plotted values,
+    so a data refresh that changes a percentile never serves a stale image."""
+    def ids(p):
+        return None if p is None else [str(p.get('player_id')), str(p.get('season_id'))]
+
+    raw = json.dumps([ids(player), radar_key, ids(reference_player), int(dpi), payload], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# One figure per (radar config, dpi) per process. The grid, ticks and metric labels are rasterized once;
+# rendering a player restores that background and draws only the polygons, annotations, title and legend.
+_radar_templates = {}
+_radar_template_lock = threading.Lock()
+
+# The template canvas is larger than the 8x8in chart so the legend (anchored right of the axes) and the title
+# fit; each image is cropped to its content, as savefig(bbox_inches='tight') would
+RADAR_CANVAS_SIZE = (12, 10)
+RADAR_AXES_RECT = (2.0, 1.5, 6.2, 6.16)  # inches: the default subplot box of an 8x8in figure
+RADAR_PAD_INCHES = 0.1
+
+
+def _radar_style():
+    import matplotlib.style
+    return matplotlib.style.library['seaborn-v0_8-notebook']
+
+
+def _build_radar_template(payload, dpi):
+    """Agg canvas with the static radar drawn and cached, plus the (hidden) per-player artists."""
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    labels = payload['labels']
+    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist() + [0]
+    zeros = [0.0] * len(angles)
+    width, height = RADAR_CANVAS_SIZE
+    left, bottom, ax_width, ax_height = RADAR_AXES_RECT
+
+    with matplotlib.rc_context(_radar_style()):
+        fig = Figure(figsize=RADAR_CANVAS_SIZE, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        fig.patch.set_facecolor('#F5F5F5')
+        ax = fig.add_axes([left / width, bottom / height, ax_width / width, ax_height / height], polar=True)
+
+        ax.set_rgrids([20, 40, 60, 80], angle=180)
+        ax.set_ylim(0, 105)
+        ax.grid(True, color='grey', linestyle='--', linewidth=0.5, alpha=0.5)
+
+        fill = ax.fill(angles, zeros, color=payload['color'], alpha=0.3, zorder=5)[0]
+        line = ax.plot(angles, zeros, color=payload['color'], linewidth=2.5, zorder=6)[0]
+        ref_line = ax.plot(angles, zeros, color='#4A90E2', linewidth=2, zorder=4, linestyle='--')[0]
+        value_texts = [
+            ax.text(angle, 0, "", ha='center', va='center', fontweight='bold', size=9, color='black',
+                    bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', boxstyle='round,pad=0.2'))
+            for angle in angles[:-1]
+        ]
+
+        ax.set_xticks(angles[:-1])
+        ax.set_xticklabels(labels, size=10, fontweight='bold')
+        title = ax.set_title("", size=16, fontweight='bold', y=1.12)
+
+        dynamic = [fill, line, ref_line, title] + value_texts
+        for artist in dynamic:
+            artist.set_visible(False)
+        canvas.draw()
+        renderer = canvas.get_renderer()
+        # Only the chart body counts towards the crop, not the (empty) canvas background
+        static_bbox = ax.get_tightbbox(renderer)
+        background = canvas.copy_from_bbox(fig.bbox)
+        for artist in dynamic:
+            artist.set_visible(True)
+
+    return {'fig': fig, 'canvas': canvas, 'ax': ax, 'angles': angles, 'fill': fill, 'line': line,
+            'ref_line': ref_line, 'value_texts': value_texts, 'title': title, 'background': background,
+            'static_bbox': static_bbox}
+
+
+def render_radar_png(payload, dpi=REPORT_DPI):
+    """Renders one radar chart to PNG bytes, reusing the radar config's template."""
+    import matplotlib
+    from matplotlib.transforms import Bbox
+    from PIL import Image
+
+    key = (payload['name'], payload['color'], tuple(payload['labels']), dpi)
+    with _radar_template_lock:
+        template = _radar_templates.get(key)
+        if template is None:
+            template = _radar_templates[key] = _build_radar_template(payload, dpi)
+
+        angles = template['angles']
+        player_values = payload['values'] + payload['values'][:1]
+        template['fill'].set_xy(np.column_stack([angles, player_values]))
+        template['line'].set_data(angles, player_values)
+        for text, angle, value in zip(template['value_texts'], angles, payload['values']):
+            text.set_position((angle, value + 7))
+            text.set_text(f"{value:.0f}")
+
+        handles = [template['line']]
+        legend_labels = [f"{payload['player_name']} (Avg: {np.mean(payload['values']):.0f}th %ile)"]
+        has_reference = payload['reference_values'] is not None
+        template['ref_line'].set_visible(has_reference)
+        if has_reference:
+            template['ref_line'].set_data(angles, payload['reference_values'] + payload['reference_values'][:1])
+            handles.append(template['ref_line'])
+            legend_labels.append(f"Target: {payload['reference_name']} (Avg: {np.mean(payload['reference_values']):.0f}th %ile)")
+        template['title'].set_text(f"{payload['name']} | {payload['player_name']}")
+
+        ax, canvas = template['ax'], template['canvas']
+        with matplotlib.rc_context(_radar_style()):
+            legend = ax.legend(handles, legend_labels, loc='upper right', bbox_to_anchor=(1.5, 1.15))
+            canvas.restore_region(template['background'])
+            renderer = canvas.get_renderer()
+            dynamic = [template['fill'], template['line'], template['ref_line'], template['title'], legend]
+            dynamic += template['value_texts']
+            # Same painter's order as a full draw: by zorder, ties in the axes' child order
+            order = {id(artist): i for i, artist in enumerate(ax.get_children())}
+            dynamic.sort(key=lambda artist: (artist.get_zorder(), order.get(id(artist), 0)))
+            extents = [template['static_bbox']]
+            for artist in dynamic:
+                if artist.get_visible():
+                    artist.draw(renderer)
+                    extents.append(artist.get_window_extent(renderer))
+
+        pad = RADAR_PAD_INCHES * dpi
+        crop = Bbox.union(extents).padded(pad)
+        width, height = canvas.get_width_height()
+        x0, x1 = max(0, int(np.floor(crop.x0))), min(width, int(np.ceil(crop.x1)))
+        y0, y1 = max(0, int(np.floor(height - crop.y1))), min(height, int(np.ceil(height - crop.y0)))
+        pixels = np.asarray(canvas.buffer_rgba())[y0:y1, x0:x1]
+
+        # The chart is opaque, so RGB loses nothing; level 3 encodes faster than the default and still smaller
+        # than the old RGBA output
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, "RGBA").convert("RGB").save(buffer, format='png', dpi=(dpi, dpi), compress_level=3)
+    return buffer.getvalue()
+
+
+def prune_image_cache(cache_dir=RADAR_IMAGE_CACHE_DIR, max_bytes=RADAR_IMAGE_CACHE_MAX_BYTES):
+    """Deletes the least recently used images (oldest mtime; cache hits refresh it) until `cache_dir`
+    holds at most `max_bytes`."""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file() and entry.name.endswith(".png")]
+    except OSError:
+        return
+    stats = sorted(((entry.stat(), entry.path) for entry in entries), key=lambda item: item[0].st_mtime)
+    total = sum(stat.st_size for stat, _ in stats)
+    for stat, path in stats:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= stat.st_size
+
+
+def render_radars(jobs, dpi=REPORT_DPI, max_workers=REPORT_MAX_WORKERS, cache_dir=RADAR_IMAGE_CACHE_DIR,
+                  on_progress=None):
+    """PNG bytes for each (cache_key, payload) job, in order.
+
+    Cached images are read back from `cache_dir`; the rest are rendered in a process pool (inline for a
+    single miss or `max_workers` <= 1), written to the cache and the cache pruned to
+    RADAR_IMAGE_CACHE_MAX_BYTES. `on_progress(done, total)` is called as images become available.
+
+    Workers are spawned, never forked: the app calls this from one of the Streamlit server's threads, and a
+    fork could copy a lock (radar templates, matplotlib, logging) held by another thread into the child.
+    """
+    images = [None] * len(jobs)
+    done = 0
+    missing = []
+    for i, (key, payload) in enumerate(jobs):
+        path = os.path.join(cache_dir, f"{key}.png")
+        try:
+            with open(path, "rb") as f:
+                images[i] = f.read()
+            os.utime(path)  # mark as recently used for prune_image_cache
+        except OSError:
+            if images[i] is None:
+                missing.append(i)
+                continue
+        done += 1
+        if on_progress:
+            on_progress(done, len(jobs))
+
+    if not missing:
+        return images
+
+    # Charts of the same radar are rendered back to back (and land in the same worker chunk), so each
+    # process builds as few radar templates as possible
+    missing.sort(key=lambda i: (jobs[i][1]['name'], jobs[i][1]['color']))
+    payloads = [jobs[i][1] for i in missing]
+    if max_workers <= 1 or len(missing) == 1:
+        rendered = (render_radar_png(payload, dpi) for payload in payloads)
+        executor = None
+    else:
+        workers = min(max_workers, len(missing))
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        chunksize = -(-len(payloads) // workers)
+        rendered = executor.map(render_radar_png, payloads, [dpi] * len(payloads), chunksize=chunksize)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for i, png in zip(missing, rendered):
+            images[i] = png
+            path = os.path.join(cache_dir, f"{jobs[i][0]}.png")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(png)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass  # the image cache is best effort
+            done += 1
+            if on_progress:
+                on_progress(done, len(jobs))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    prune_image_cache(cache_dir)
+    return images
+
+
+# --- 4. REPORT DOCUMENT ---
+def set_cell_style(cell, text, bold=False, font_size=10, align='CENTER'):
+    """Helper function to style cells in a .docx table."""
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    p = cell.paragraphs[0]
+    p.text = str(text)
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER if align == 'CENTER' else WD_ALIGN_PARAGRAPH.LEFT
+    run = p.runs[0]
+    run.font.name = 'Calibri'
+    run.font.size = Pt(font_size)
+    run.font.bold = bold
+
+
+def _add_radar_grid(doc, images):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches
+
+    table = doc.add_table(rows=(len(images) + 2) // 3, cols=3)
+    for i, png in enumerate(images):
+        p = table.cell(i // 3, i % 3).paragraphs[0]
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        p.add_run().add_picture(io.BytesIO(png), width=Inches(2.3))
+
+
+def create_report_document(target_player, top_matches, other_matches, archetype_dna, search_config, radar_configs,
+                           dpi=REPORT_DPI, max_workers=REPORT_MAX_WORKERS, cache_dir=RADAR_IMAGE_CACHE_DIR,
+                           on_progress=None):
+    """Assembles the .docx report: target radars, one radar page per top match, and a table of the rest.
+
+    `archetype_dna` maps archetype name -> affinity score; `radar_configs` is a position's radar dict.
+    All radars are rendered up front through render_radars.
+    """
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    radar_items = list(radar_configs.items())
+    jobs = []
+    for player, reference in [(target_player, None)] + [(row, target_player) for _, row in top_matches.iterrows()]:
+        for radar_key, radar_config in radar_items:
+            payload = radar_payload(player, reference, radar_config)
+            jobs.append((radar_cache_key(player, reference, radar_key, payload, dpi), payload))
+    images = render_radars(jobs, dpi=dpi, max_workers=max_workers, cache_dir=cache_dir, on_progress=on_progress)
+    per_player = [images[i:i + len(radar_items)] for i in range(0, len(images), len(radar_items))]
+
+    doc = Document()
+    doc.styles['Normal'].font.name = 'Calibri'
+    doc.add_heading(f'{search_config["position"]} {search_config["mode"].title()} Report', 0).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_heading(f'Target Player: {target_player["player_name"]}', level=1)
+
+    age = target_player.get('age')
+    age_str = f"{int(age)}" if pd.notna(age) else "N/A"
+    doc.add_paragraph(f"**Age:** {age_str} | **Team:** {target_player['team_name']} | **League:** {target_player['league_name']}")
+
+    doc.add_heading('Archetype DNA & Search Filters', level=2)
+    dna_table = doc.add_table(rows=1, cols=2)
+    dna_table.style = 'Table Grid'
+    set_cell_style(dna_table.cell(0, 0), "Archetype", bold=True)
+    set_cell_style(dna_table.cell(0, 1), "Affinity Score", bold=True)
+    for name, score in sorted(archetype_dna.items(), key=lambda item: item[1], reverse=True):
+        cells = dna_table.add_row().cells
+        set_cell_style(cells[0], name)
+        set_cell_style(cells[1], f"{score:.1f}")
+
+    doc.add_paragraph(f"\n**Detected Archetype:** {search_config['archetype']}\n**Search Mode:** {search_config['mode'].title()}")
+
+    doc.add_heading('Target Player Performance Radars', level=2)
+    _add_radar_grid(doc, per_player[0])
+
+    if not top_matches.empty:
+        doc.add_page_break()
+        doc.add_heading(f"Top {len(top_matches)} Matches", level=1)
+        score_col = 'upgrade_score' if search_config["mode"] == 'upgrade' else 'similarity_score'
+        score_label = "Upgrade Score" if search_config["mode"] == 'upgrade' else "Similarity"
+        for i, (_, player) in enumerate(top_matches.iterrows()):
+            age = player.get('age')
+            age_str = f"{int(age)}" if pd.notna(age) else "N/A"
+            doc.add_heading(f"#{i+1}: {player['player_name']} ({score_label}: {player[score_col]:.1f})", level=2)
+            doc.add_paragraph(f"**Age:** {age_str} | **Team:** {player['team_name']} | **League:** {player['league_name']}")
+            _add_radar_grid(doc, per_player[i + 1])
+            if i < len(top_matches) - 1: doc.add_page_break()
+
+    if not other_matches.empty:
+        doc.add_page_break()
+        doc.add_heading("Other Notable Matches", level=1)
+        table = doc.add_table(rows=1, cols=5)
+        table.style = 'Table Grid'
+        headers = ['Rank', 'Player', 'Age', 'Team', 'League']
+        for i, h in enumerate(headers): set_cell_style(table.cell(0, i), h, bold=True)
+        for i, (_, row) in enumerate(other_matches.iterrows()):
+            cells = table.add_row().cells
+            set_cell_style(cells[0], str(i + len(top_matches) + 1))
+            set_cell_style(cells[1], row['player_name'], align='LEFT')
+            age = row.get('age')
+            set_cell_style(cells[2], f"{int(age)}" if pd.notna(age) else "N/A")
+            set_cell_style(cells[3], row['team_name'], align='LEFT')
+            set_cell_style(cells[4], row['league_name'], align='LEFT')
+
+    return doc
+
+
+def report_bytes(doc):
+    """Serializes a python-docx Document in memory (e.g. for a download button)."""
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,84 @@
+"""Recall of the opt-in archetype prefilter against the full find_matches search.
+
+Synthetic Striker group with structured archetype profiles: each player mixes the archetype prototypes, plus an
+overall-quality factor and noise. Seeded, so the numbers are reproducible run to run.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+GROUP = 'Striker'
+N_ROWS = 150_000
+N_TARGETS = 30
+
+# Documented floor at the default margin/top_k with a cached similarity index (see ARCHETYPE_PREFILTER_MARGIN)
+MIN_RECALL_AT_10 = 0.6
+MIN_CLONE_RECALL = 0.95
+MAX_KEPT_SHARE = 0.4
+
+
+def make_group(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    archetypes = core.POSITIONAL_CONFIGS[GROUP]['archetypes']
+    metrics = list(dict.fromkeys(m for a in archetypes.values() for m in a['identity_metrics']))
+    prototypes = np.array([[float(m in a['identity_metrics']) for m in metrics] for a in archetypes.values()])
+
+    mix = rng.dirichlet(np.full(len(archetypes), 0.4), n_rows)
+    latent = 1.3 * mix @ prototypes + rng.normal(0, 0.5, (n_rows, 1)) + rng.normal(0, 0.6, (n_rows, len(metrics)))
+    df = pd.DataFrame(np.exp(latent), columns=metrics)
+    df[rng.random((n_rows, len(metrics))) < 0.02] = np.nan
+    df['position_group'] = GROUP
+    df['player_id'] = np.arange(n_rows)
+    df['player_name'] = [f'Player {i}' for i in range(n_rows)]
+    df['minutes'] = rng.integers(0, 3000, n_rows).astype(float)
+
+    df = pd.concat([df, core.compute_group_percentiles(df, metrics, core.NEGATIVE_STATS)], axis=1)
+    return pd.concat([df, core.compute_archetype_affinities(df)], axis=1)
+
+
+@pytest.fixture(scope='module')
+def recall():
+    df = make_group(N_ROWS)
+    archetypes = core.POSITIONAL_CONFIGS[GROUP]['archetypes']
+    archetype_index = core.build_archetype_index(df)
+    pool = df[df['minutes'] >= 600]
+    z_cols = [c for c in core.GROUP_Z_COLS[GROUP] if c in df.columns]
+    similarity_index = core.build_similarity_index(pool, z_cols)
+
+    recall_10, clone_recall, kept = [], [], []
+    for _, target in pool.sample(N_TARGETS, random_state=1).iterrows():
+        archetype, _ = core.detect_player_archetype(target, archetypes, GROUP)
+        config = archetypes[archetype]
+        full = core.find_matches(target, df, config, top_n=100, similarity_index=similarity_index)
+        rows = core.archetype_prefilter(archetype_index, target, archetype)
+        filtered = core.find_matches(target, df, config, top_n=100, similarity_index=similarity_index,
+                                     candidate_rows=rows)
+
+        kept.append(len(rows) / len(df))
+        top_10 = set(full.index[:10])
+        recall_10.append(len(top_10 & set(filtered.index[:10])) / max(1, len(top_10)))
+        clones = set(full.index[full['match_tier'] == 'True Clone'])
+        if clones:
+            clone_recall.append(len(clones & set(filtered.index[filtered['match_tier'] == 'True Clone'])) / len(clones))
+    return {'recall@10': np.mean(recall_10), 'clone recall': np.mean(clone_recall), 'kept': np.mean(kept)}
+
+
+def test_prefilter_shrinks_the_pool(recall):
+    assert recall['kept'] <= MAX_KEPT_SHARE
+
+
+def test_prefilter_keeps_top_matches(recall):
+    assert recall['recall@10'] >= MIN_RECALL_AT_10
+
+
+def test_prefilter_keeps_true_clones(recall):
+    assert recall['clone recall'] >= MIN_CLONE_RECALL
+
+
+def test_prefilter_without_affinity_is_a_no_op():
+    df = make_group(200)
+    target = df.iloc[0].drop([c for c in df.columns if c.startswith('affinity:')])
+    archetype = next(iter(core.POSITIONAL_CONFIGS[GROUP]['archetypes']))
+    assert core.archetype_prefilter(core.build_archetype_index(df), target, archetype) is None
@@ -0,0 +1,52 @@
+"""Feature store keys and the memory-mapped processed frame."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+
+def test_dataset_version_ignores_fetch_order():
+    cached_first = {(2, 20): 100, (1, 10): 50, (1, 11): 300}
+    refetched_last = {(1, 10): 50, (1, 11): 300, (2, 20): 100}
+    assert core.dataset_version(cached_first) == core.dataset_version(refetched_last)
+    assert core.feature_store_key(core.dataset_version(cached_first)) == \
+        core.feature_store_key(core.dataset_version(refetched_last))
+    assert core.dataset_version({**cached_first, (1, 11): 301}) != core.dataset_version(cached_first)
+
+
+@pytest.fixture
+def store_frame(tmp_path):
+    rng = np.random.default_rng(0)
+    groups = ['Center Back'] * 4 + ['Striker'] * 5 + ['Winger'] * 3
+    df = pd.DataFrame({
+        'player_name': [f'Player {i}' for i in range(len(groups))],
+        'league_name': ['A', 'B'] * (len(groups) // 2),
+        'position_group': pd.Categorical(groups),
+        'goals_90_pct': rng.uniform(0, 100, len(groups)).astype(np.float32),
+        'goals_90_z': rng.normal(size=len(groups)).astype(np.float32),
+    }, index=pd.Index(rng.permutation(100)[:len(groups)]))
+    assert core.write_feature_store(df, ['goals_90'], 'v1', str(tmp_path)) is not None
+    return core.open_feature_store('v1', str(tmp_path))
+
+
+def test_group_rows_slices_the_store_frame(store_frame):
+    assert core.is_feature_store_frame(store_frame)
+    strikers = core.group_rows(store_frame, 'Striker')
+    assert (strikers['position_group'] == 'Striker').all() and len(strikers) == 5
+    assert np.shares_memory(strikers['goals_90_z'].to_numpy(), store_frame['goals_90_z'].to_numpy())
+
+
+@pytest.mark.parametrize('derive', [
+    lambda df: df[df['league_name'] == 'B'],
+    lambda df: df.iloc[3:],
+    lambda df: df.sample(frac=1, random_state=0),
+    lambda df: df.copy(),
+])
+def test_group_rows_of_a_derived_frame_uses_its_own_rows(store_frame, derive):
+    derived = derive(store_frame)
+    assert not core.is_feature_store_frame(derived)
+    for group in ('Center Back', 'Striker', 'Winger'):
+        rows = core.group_rows(derived, group)
+        expected = derived[derived['position_group'] == group]
+        assert rows.index.equals(expected.index)
@@ -0,0 +1,179 @@
+"""The /player-stats downloader against a local http.server stub of the API."""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scouting_core as core
+
+PLAYER_STATS_RE = re.compile(r"^/v1/competitions/(-?\d+)/seasons/(-?\d+)/player-stats$")
+
+
+class StubAPI:
+    """Serves /v4/competitions and /player-stats, recording every request it sees."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.failures = {}  # (competition_id, season_id) -> number of 503s still to send (-1: always)
+        self.versions = {}  # (competition_id, season_id) -> payload version, part of the ETag
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def etag(self, key):
+        return f'"{key[0]}-{key[1]}-v{self.versions.get(key, 1)}"'
+
+    def hits(self, key):
+        return sum(1 for seen, _ in self.requests if seen == key)
+
+    def handle(self, handler):
+        match = PLAYER_STATS_RE.match(handler.path)
+        if handler.path == "/v4/competitions":
+            return 200, {}, []
+        if not match:
+            return 404, {}, None
+        key = (int(match.group(1)), int(match.group(2)))
+        with self.lock:
+            self.requests.append((key, handler.headers.get("If-None-Match")))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            remaining = self.failures.get(key, 0)
+            if remaining > 0:
+                self.failures[key] = remaining - 1
+        try:
+            time.sleep(self.delay)
+            if remaining:
+                return 503, {}, None
+            etag = self.etag(key)
+            if handler.headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, None
+            payload = [{"player_id": key[0] * 1000 + i, "player_name": f"Player {i}",
+                        "player_season_minutes": 900 + i} for i in range(3)]
+            return 200, {"ETag": etag, "Last-Modified": "Sat, 17 Oct 2026 00:00:00 GMT"}, payload
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def api():
+    stub = StubAPI()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, payload = stub.handle(self)
+            body = b"" if payload is None else json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    stub.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = core.make_api_session(("user", "password"))
+    yield session
+    session.close()
+
+
+def test_fetches_partitions_concurrently(api, session):
+    api.delay = 0.2
+    seasons = {1: [10, 11, 12], 2: [20, 21, 22]}
+
+    started = time.perf_counter()
+    results = core.fetch_player_stats(session, seasons, base_url=api.base_url, max_workers=6)
+    elapsed = time.perf_counter() - started
+
+    assert set(results) == {(c, s) for c, ss in seasons.items() for s in ss}
+    assert all(r["status"] == "ok" and len(r["data"]) == 3 for r in results.values())
+    assert results[(2, 21)]["etag"] == api.etag((2, 21))
+    assert api.max_in_flight > 1
+    assert elapsed < 6 * api.delay
+
+
+def test_retries_503_with_backoff(api, session):
+    api.failures[(1, 10)] = 2
+    api.failures[(1, 11)] = -1
+
+    started = time.perf_counter()
+    results = core.fetch_player_stats(session, {1: [10, 11]}, base_url=api.base_url, retries=2, backoff=0.05)
+    elapsed = time.perf_counter() - started
+
+    assert results[(1, 10)]["status"] == "ok"
+    assert api.hits((1, 10)) == 3
+    assert results[(1, 11)]["status"] == "failed"
+    assert api.hits((1, 11)) == 3
+    assert elapsed >= 0.05 + 0.1  # two backoffs: backoff, then 2 * backoff
+
+
+def test_etag_revalidation_returns_not_modified(api, session):
+    first = core.fetch_player_stats(session, {1: [10, 11]}, base_url=api.base_url)
+    validators = {key: {"etag": r["etag"], "last_modified": r["last_modified"]} for key, r in first.items()}
+    api.versions[(1, 11)] = 2
+
+    second = core.fetch_player_stats(session, {1: [10, 11]}, base_url=api.base_url, validators=validators)
+
+    assert second[(1, 10)]["status"] == "not_modified"
+    assert second[(1, 10)]["data"] is None
+    assert second[(1, 10)]["etag"] == first[(1, 10)]["etag"]
+    assert second[(1, 11)]["status"] == "ok"
+    assert second[(1, 11)]["etag"] == api.etag((1, 11))
+    assert ((1, 10), first[(1, 10)]["etag"]) in api.requests
+
+
+def test_progress_callback_reports_every_partition(api, session):
+    api.failures[(2, 20)] = -1
+    calls = []
+    caller = threading.get_ident()
+
+    def on_progress(done, total, competition_id, season_id, ok):
+        calls.append((done, total, (competition_id, season_id), ok, threading.get_ident()))
+
+    core.fetch_player_stats(session, {1: [10, 11], 2: [20]}, base_url=api.base_url, retries=0,
+                            on_progress=on_progress)
+
+    assert [c[0] for c in calls] == [1, 2, 3]
+    assert {c[1] for c in calls} == {3}
+    assert {c[2]: c[3] for c in calls} == {(1, 10): True, (1, 11): True, (2, 20): False}
+    assert {c[4] for c in calls} == {caller}
+
+
+def test_load_partitions_revalidates_stale_current_seasons(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "COMPETITION_SEASONS", {1: [10, 11]})
+    monkeypatch.setattr(core, "CURRENT_SEASON_IDS", frozenset({11}))
+    cache_dir = str(tmp_path)
+
+    partitions, versions, error = core.load_partitions(("user", "password"), cache_dir=cache_dir,
+                                                       base_url=api.base_url)
+    assert error is None
+    assert set(partitions) == {(1, 10), (1, 11)}
+    assert core.read_partition_meta(1, 11, cache_dir)["etag"] == api.etag((1, 11))
+
+    # Completed seasons are never refetched; the stale current season is revalidated and comes back 304
+    api.requests.clear()
+    partitions_again, versions_again, _ = core.load_partitions(("user", "password"), cache_dir=cache_dir,
+                                                               max_age=0, base_url=api.base_url)
+    assert api.requests == [((1, 11), api.etag((1, 11)))]
+    assert versions_again == versions
+    assert partitions_again[(1, 11)].equals(partitions[(1, 11)])
@@ -0,0 +1,46 @@
+"""find_matches_batch: the many-targets similarity search used by batch_scout."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+GROUP = 'Center Back'
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(7)
+    n_rows = 3000
+    metrics = list(core.GROUP_IDENTITY_METRICS[GROUP])
+    df = pd.DataFrame(rng.gamma(2.0, 1.5, (n_rows, len(metrics))), columns=metrics)
+    df[rng.random((n_rows, len(metrics))) < 0.05] = np.nan
+    df['position_group'] = GROUP
+    df['player_id'] = np.arange(n_rows)
+    df['player_name'] = [f'Player {i}' for i in range(n_rows)]
+    df['minutes'] = rng.integers(0, 3000, n_rows).astype(float)
+    df['age'] = rng.integers(17, 36, n_rows).astype(float)
+    return pd.concat([df, core.compute_group_percentiles(df, metrics, core.NEGATIVE_STATS)], axis=1)
+
+
+@pytest.fixture(scope='module')
+def targets(frame):
+    return frame[frame['minutes'] >= 600].sample(12, random_state=3)
+
+
+def test_candidate_rows_filter_matches_without_changing_scores(frame, targets):
+    young = frame.index[frame['age'] <= 23]
+    full = core.find_matches_batch(targets, frame, top_n=frame.shape[0])
+    filtered = core.find_matches_batch(targets, frame, top_n=50, candidate_rows=young)
+
+    assert filtered['player_id'].isin(frame.loc[young, 'player_id']).all()
+    assert (filtered.groupby('target_index').size() == 50).all()
+    merged = filtered.merge(full, on=['target_index', 'player_id'], suffixes=('', '_full'))
+    assert len(merged) == len(filtered)
+    np.testing.assert_allclose(merged['similarity_score'], merged['similarity_score_full'])
+
+
+def test_results_do_not_depend_on_chunk_size(frame, targets):
+    one_by_one = core.find_matches_batch(targets, frame, top_n=30, chunk_size=1)
+    chunked = core.find_matches_batch(targets, frame, top_n=30, chunk_size=5)
+    pd.testing.assert_frame_equal(one_by_one, chunked)
@@ -0,0 +1,85 @@
+"""Player name index and search: accent folding, punctuation, typos and ranking."""
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+
+@pytest.fixture(scope='module')
+def players():
+    rows = [
+        ('Martin Ødegaard', 'Arsenal', 2024, 2800),
+        ('Martin Ødegaard', 'Real Madrid', 2020, 900),
+        ("John O'Shea", 'Sunderland', 2014, 2500),
+        ('Lionel Messi', 'Inter Miami', 2024, 2100),
+        ('Lionel Mesa', 'Somewhere FC', 2024, 1500),
+        ('Messias Silva', 'Porto B', 2024, 1200),
+        ('Kristoffer Ajer', 'Brentford', 2024, 1800),
+        ('Ajer Kristoffersen', 'Molde', 2023, 1700),
+    ]
+    df = pd.DataFrame(rows, columns=['player_name', 'team_name', 'canonical_season', 'minutes'],
+                      index=[10, 11, 20, 30, 31, 32, 40, 41])
+    return df, core.build_name_index(df)
+
+
+def top_names(df, hits):
+    return [df.loc[rows[0], 'player_name'] for rows, _ in hits]
+
+
+def test_normalize_player_name_folds_accents_case_and_punctuation():
+    assert core.normalize_player_name('Martin Ødegaard') == 'martin odegaard'
+    assert core.normalize_player_name("  John O'Shea ") == 'john oshea'
+    assert core.normalize_player_name('Jean-Philippe  MATETA') == 'jean philippe mateta'
+
+
+def test_accent_insensitive_query(players):
+    df, index = players
+    hits = core.search_player_names(index, 'odegaard')
+    assert top_names(df, hits)[0] == 'Martin Ødegaard'
+    # Every season of that name, newest first
+    assert hits[0][0] == [10, 11]
+
+
+@pytest.mark.parametrize('query', ["o'shea", 'oshea', "john o'shea", 'OSHEA'])
+def test_punctuation_insensitive_query(players, query):
+    df, index = players
+    assert top_names(df, core.search_player_names(index, query))[0] == "John O'Shea"
+
+
+def test_misspelt_query(players):
+    df, index = players
+    names = top_names(df, core.search_player_names(index, 'lionel mesi'))
+    assert names[0] == 'Lionel Messi'
+    assert 'Lionel Mesa' in names
+
+
+def test_exact_match_ranks_first(players):
+    df, index = players
+    hits = core.search_player_names(index, 'kristoffer ajer')
+    assert top_names(df, hits)[:2] == ['Kristoffer Ajer', 'Ajer Kristoffersen']
+    assert hits[0][1] > hits[1][1] + 1.0 - 1e-9  # the exact-match bonus
+
+
+@pytest.mark.parametrize('query', ['', '   ', None, "'-'"])
+def test_empty_query_returns_nothing(players, query):
+    _, index = players
+    assert core.search_player_names(index, query) == []
+
+
+def test_limit_and_min_score(players):
+    _, index = players
+    assert len(core.search_player_names(index, 'lionel', limit=1)) == 1
+    assert core.search_player_names(index, 'zzzzqqq') == []
+
+
+def test_find_player_by_name(players):
+    df, index = players
+    row, suggestions = core.find_player_by_name(df, 'MARTIN ODEGAARD', name_index=index)
+    assert row['team_name'] == 'Arsenal' and suggestions is None
+
+    row, suggestions = core.find_player_by_name(df, 'lionel mesi', name_index=index)
+    assert row is None
+    assert suggestions[0] == {'player_name': 'Lionel Messi', 'team_name': 'Inter Miami'}
+
+    assert core.find_player_by_name(df, '', name_index=index) == (None, None)
+    assert core.find_player_by_name(df, 'zzzzqqq') == (None, None)
@@ -0,0 +1,35 @@
+"""Row-level processing: ages from birth dates."""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+AS_OF = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize('birth_date, age', [
+    ('2000-10-17', 26),  # birthday on as_of
+    ('2000-10-18', 25),  # birthday the day after as_of
+    ('2000-10-16', 26),
+    ('2004-02-29', 22),
+    ('1990-01-01T00:00:00Z', 36),  # timezone-aware
+    ('1995-12-31 15:30:00', 30),
+    ('10/18/1999', 26),
+    ('not a date', np.nan),
+    (None, np.nan),
+    (np.nan, np.nan),
+])
+def test_calculate_ages(birth_date, age):
+    ages = core.calculate_ages(pd.Series([birth_date], dtype=object), AS_OF)
+    np.testing.assert_array_equal(ages.to_numpy(), [age])
+
+
+def test_calculate_ages_of_a_mixed_column():
+    birth_dates = pd.Series(['2000-10-17', '1990-01-01T00:00:00Z', None, 'garbage', '10/18/1999', '2000-10-18'],
+                            index=[5, 3, 9, 1, 7, 2])
+    ages = core.calculate_ages(birth_dates, AS_OF)
+    assert ages.index.equals(birth_dates.index)
+    np.testing.assert_array_equal(ages.to_numpy(), [26, 36, np.nan, np.nan, 26, 25])
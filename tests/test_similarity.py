@@ -0,0 +1,147 @@
+"""Similarity engine: the pool covariance cache, the cached similarity index and the approximate search."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import scouting_core as core
+
+GROUP = 'Center Back'
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    """Empty covariance cache; counts the fits that actually run."""
+    monkeypatch.setattr(core, '_covariance_cache', core.OrderedDict())
+    calls = []
+    fit = core.fit_pool_covariance
+
+    def counting_fit(*args, **kwargs):
+        calls.append(1)
+        return fit(*args, **kwargs)
+
+    monkeypatch.setattr(core, 'fit_pool_covariance', counting_fit)
+    return calls
+
+
+@pytest.fixture
+def pool_matrix():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6)) @ rng.normal(size=(6, 6))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X, [f'm{i}_z' for i in range(6)], np.arange(1000, 1400)
+
+
+def test_repeat_fit_on_the_same_pool_is_a_cache_hit(fits, pool_matrix):
+    X, z_cols, row_ids = pool_matrix
+    first = core.pool_covariance(X, z_cols, row_ids)
+    again = core.pool_covariance(X.copy(), list(z_cols), row_ids.copy())
+    assert len(fits) == 1
+    assert again is first
+    np.testing.assert_array_equal(again['VI'], first['VI'])
+
+
+@pytest.mark.parametrize('change', ['row_id', 'z_col', 'value', 'swap', 'missing'])
+def test_changed_pool_is_a_cache_miss(fits, pool_matrix, change):
+    X, z_cols, row_ids = pool_matrix
+    first = core.pool_covariance(X, z_cols, row_ids)
+    X2, z_cols2, row_ids2 = X.copy(), list(z_cols), row_ids.copy()
+    if change == 'row_id':
+        row_ids2[7] = 5000
+    elif change == 'z_col':
+        z_cols2[2] = 'other_z'
+    elif change == 'value':
+        X2[3, 1] += 0.25
+    elif change == 'swap':  # same column sums, different covariance
+        X2[[0, 1], 2] = X2[[1, 0], 2]
+    else:
+        X2[4, 4] = np.nan
+
+    second = core.pool_covariance(X2, z_cols2, row_ids2)
+    assert len(fits) == 2
+    assert second is not first
+
+
+def test_pools_without_row_ids_are_not_cached(fits, pool_matrix):
+    X, z_cols, _ = pool_matrix
+    core.pool_covariance(X, z_cols)
+    core.pool_covariance(X, z_cols)
+    assert len(fits) == 2 and not core._covariance_cache
+
+
+def test_cache_evicts_the_least_recently_used_pool(fits, pool_matrix, monkeypatch):
+    monkeypatch.setattr(core, 'COVARIANCE_CACHE_SIZE', 2)
+    X, z_cols, row_ids = pool_matrix
+    pools = [row_ids + offset for offset in (0, 10_000, 20_000)]
+    core.pool_covariance(X, z_cols, pools[0])
+    core.pool_covariance(X, z_cols, pools[1])
+    core.pool_covariance(X, z_cols, pools[0])  # hit; pools[1] is now the oldest
+    core.pool_covariance(X, z_cols, pools[2])
+    assert len(fits) == 3
+    core.pool_covariance(X, z_cols, pools[0])
+    assert len(fits) == 3
+    core.pool_covariance(X, z_cols, pools[1])
+    assert len(fits) == 4
+
+
+# --- find_matches with a cached similarity index / the approximate search ---
+
+def make_group(n_rows, n_sources=8, copies=4, seed=0):
+    """Structured archetype profiles; the first `n_sources` players each get `copies` near-duplicates (clones)."""
+    rng = np.random.default_rng(seed)
+    archetypes = core.POSITIONAL_CONFIGS[GROUP]['archetypes']
+    metrics = list(dict.fromkeys(m for a in archetypes.values() for m in a['identity_metrics']))
+    prototypes = np.array([[float(m in a['identity_metrics']) for m in metrics] for a in archetypes.values()])
+    mix = rng.dirichlet(np.full(len(archetypes), 0.4), n_rows)
+    latent = 1.3 * mix @ prototypes + rng.normal(0, 0.5, (n_rows, 1)) + rng.normal(0, 0.6, (n_rows, len(metrics)))
+    latent[n_rows - n_sources * copies:] = (np.repeat(latent[:n_sources], copies, axis=0)
+                                            + rng.normal(0, 0.05, (n_sources * copies, len(metrics))))
+    df = pd.DataFrame(np.exp(latent), columns=metrics)
+    df[rng.random((n_rows, len(metrics))) < 0.02] = np.nan
+    df['position_group'] = GROUP
+    df['player_id'] = np.arange(n_rows)
+    df['player_name'] = [f'Player {i}' for i in range(n_rows)]
+    df['minutes'] = rng.integers(0, 3000, n_rows).astype(float)
+    df.loc[df.index[:n_sources], 'minutes'] = 2000.0
+    df.loc[df.index[n_rows - n_sources * copies:], 'minutes'] = 2000.0
+    return pd.concat([df, core.compute_group_percentiles(df, metrics, core.NEGATIVE_STATS)], axis=1)
+
+
+@pytest.fixture(scope='module')
+def league():
+    df = make_group(int(core.ANN_MIN_POOL_SIZE * 1.5))
+    pool = df[df['minutes'] >= 600]
+    assert len(pool) >= core.ANN_MIN_POOL_SIZE  # large enough for approximate=True to take the KD-tree path
+    z_cols = [c for c in core.GROUP_Z_COLS[GROUP] if c in df.columns]
+    targets = pd.concat([pool.iloc[:8], pool.iloc[8:].sample(4, random_state=2)])
+    return df, core.build_similarity_index(pool, z_cols), targets
+
+
+def archetype_of(target):
+    archetypes = core.POSITIONAL_CONFIGS[GROUP]['archetypes']
+    return archetypes[core.detect_player_archetype(target, archetypes, GROUP)[0]]
+
+
+@pytest.mark.parametrize('search_mode', ['similar', 'upgrade'])
+def test_similarity_index_ranks_like_a_direct_search(league, search_mode):
+    df, index, targets = league
+    for _, target in targets.iterrows():
+        config = archetype_of(target)
+        direct = core.find_matches(target, df, config, search_mode=search_mode, top_n=50)
+        indexed = core.find_matches(target, df, config, search_mode=search_mode, top_n=50, similarity_index=index)
+        assert list(indexed.index) == list(direct.index)
+        assert (indexed['match_tier'] == direct['match_tier']).all()
+        np.testing.assert_allclose(indexed['similarity_score'], direct['similarity_score'], atol=1e-3)
+
+
+def test_approximate_search_returns_the_same_true_clones(league):
+    df, index, targets = league
+    clones_seen = 0
+    for _, target in targets.iterrows():
+        config = archetype_of(target)
+        exact = core.find_matches(target, df, config, top_n=100, similarity_index=index)
+        approximate = core.find_matches(target, df, config, top_n=100, similarity_index=index, approximate=True)
+        exact_clones = exact[exact['match_tier'] == 'True Clone']
+        approximate_clones = approximate[approximate['match_tier'] == 'True Clone']
+        assert list(approximate_clones.index) == list(exact_clones.index)
+        clones_seen += len(exact_clones)
+    assert clones_seen > 0